@@ -0,0 +1,205 @@
+"""
+A benchmark of the strategies in game_interface.usable_strategies.
+
+Every strategy except the interactive one picks a move for each position
+of a matrix of games, board sizes and mid-game positions. For each run the
+move, wall time, nodes expanded, nodes per second and peak memory are
+recorded and written as JSON, and compared against a stored baseline.
+
+Run it with:
+    python benchmark.py --output results.json --baseline baseline.json
+and with --no-ordering to see how many nodes move ordering saves.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+from game_interface import usable_strategies, applies_to
+import move_ordering
+from stonehenge import StonehengeGame, BitboardStonehengeGame
+from subtract_square_game import SubtractSquareGame
+
+# (name, game class, parameter, moves played before the strategy is asked)
+POSITIONS = [('stonehenge-1', StonehengeGame, 1, ''),
+             ('stonehenge-2', StonehengeGame, 2, ''),
+             ('stonehenge-3', StonehengeGame, 3, ''),
+             ('stonehenge-3-mid', StonehengeGame, 3, 'DKJC'),
+             ('stonehenge-4-mid', StonehengeGame, 4, 'HKDOILCB'),
+             ('stonehenge-5-mid', StonehengeGame, 5, 'TIMXSARJCHDLPG'),
+             ('bitboard-3', BitboardStonehengeGame, 3, ''),
+             ('bitboard-4-mid', BitboardStonehengeGame, 4, 'HKDOILCB'),
+             ('bitboard-5-mid', BitboardStonehengeGame, 5,
+              'TIMXSARJCHDLPG'),
+             ('subtract-20', SubtractSquareGame, 20, ''),
+             ('subtract-40', SubtractSquareGame, 40, '')]
+
+
+def make_game(game_class: type, parameter: int, moves: str) -> Any:
+    """
+    Return a game of game_class with p1 starting, built from parameter,
+    after each letter of moves was played.
+    """
+    game = game_class(True, parameter)
+    for move in moves:
+        game.current_state = game.current_state.make_move(move)
+    return game
+
+
+class NodeCounter:
+    """
+    A replacement for the is_over method of a game which counts the states
+    it is asked about, as every search does once per node it expands.
+    Searches run in other processes are not counted.
+
+    game: the game whose is_over this replaces
+    count: the number of calls so far
+    """
+    game: Any
+    count: int
+
+    def __init__(self, game: Any) -> None:
+        """
+        Replace the is_over method of game by this NodeCounter.
+        """
+        self.game = game
+        self.count = 0
+        game.is_over = self
+
+    def __call__(self, state: Any) -> bool:
+        """
+        Count state and return whether the game is over at state.
+        """
+        self.count += 1
+        return type(self.game).is_over(self.game, state)
+
+
+def run(strategy: Callable, game_class: type, parameter: int,
+        moves: str) -> Dict[str, Any]:
+    """
+    Return the measurements of strategy choosing a move in a position.
+    The first call runs under tracemalloc to measure peak memory, and also
+    warms up any cache the strategy builds once. The second call is timed.
+    """
+    tracemalloc.start()
+    try:
+        strategy(make_game(game_class, parameter, moves))
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    game = make_game(game_class, parameter, moves)
+    counter = NodeCounter(game)
+    start = time.perf_counter()
+    move = strategy(game)
+    seconds = time.perf_counter() - start
+    return {'move': move, 'seconds': seconds, 'nodes': counter.count,
+            'nodes_per_second': counter.count / seconds if seconds > 0 else 0,
+            'peak_memory': peak_memory}
+
+
+def run_all(strategies: List[str], positions: List[Tuple]) \
+        -> List[Dict[str, Any]]:
+    """
+    Return the measurements of every strategy in strategies for every
+    position in positions. A run that fails records its error instead.
+    """
+    results = []
+    for name, game_class, parameter, moves in positions:
+        for key in strategies:
+            if not applies_to(key, game_class):
+                continue
+            result = {'position': name, 'strategy': key}
+            try:
+                result.update(run(usable_strategies[key], game_class,
+                                  parameter, moves))
+            except (RecursionError, MemoryError) as error:
+                result['error'] = type(error).__name__
+            print(format_result(result), file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    """
+    Return result as one line of text.
+    """
+    if 'error' in result:
+        return "{:18} {:3} {}".format(result['position'], result['strategy'],
+                                      result['error'])
+    return "{:18} {:3} move {:>4} {:9.4f}s {:9} nodes {:11.0f} nodes/s " \
+           "{:9.1f} KiB".format(result['position'], result['strategy'],
+                                str(result['move']), result['seconds'],
+                                result['nodes'], result['nodes_per_second'],
+                                result['peak_memory'] / 1024)
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+            tolerance: float) -> List[str]:
+    """
+    Return a line for every run in results that chose a different move,
+    expanded more nodes, or took more than 1 + tolerance times as long as
+    the same run in baseline.
+    """
+    old = {(b['position'], b['strategy']): b for b in baseline}
+    regressions = []
+    for result in results:
+        before = old.get((result['position'], result['strategy']))
+        if before is None or 'error' in result or 'error' in before:
+            continue
+        name = "{} {}".format(result['position'], result['strategy'])
+        if result['move'] != before['move']:
+            regressions.append("{}: move {} instead of {}".format(
+                name, result['move'], before['move']))
+        if result['nodes'] > before['nodes']:
+            regressions.append("{}: {} nodes instead of {}".format(
+                name, result['nodes'], before['nodes']))
+        if result['seconds'] > before['seconds'] * (1 + tolerance):
+            regressions.append("{}: {:.4f}s instead of {:.4f}s".format(
+                name, result['seconds'], before['seconds']))
+    return regressions
+
+
+def main(argv: List[str]) -> int:
+    """
+    Run the benchmark from the command line arguments argv and return the
+    exit status, which is 1 if there are regressions against the baseline.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--strategies', nargs='+',
+                        default=[key for key in usable_strategies
+                                 if key != 'i'])
+    parser.add_argument('--positions', nargs='+',
+                        default=[position[0] for position in POSITIONS])
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write the results to the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--no-ordering', action='store_true',
+                        help='search moves in the order they are generated')
+    args = parser.parse_args(argv)
+    move_ordering.enabled = not args.no_ordering
+    results = run_all(args.strategies, [position for position in POSITIONS
+                                        if position[0] in args.positions])
+    with open(args.output, 'w') as file:
+        json.dump({'python': sys.version, 'ordering': move_ordering.enabled,
+                   'results': results}, file, indent=1)
+    if args.baseline is None:
+        return 0
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump({'python': sys.version,
+                       'ordering': move_ordering.enabled,
+                       'results': results}, file, indent=1)
+        return 0
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file)['results'],
+                              args.tolerance)
+    for line in regressions:
+        print(line)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
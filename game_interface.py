@@ -9,15 +9,25 @@ strategy cannot be used on Chopsticks unless you account for infinite loops.
 your own curiousity!)
 """
 # TODO: import the modules needed to make game_interface run.
+import sys
 from strategy import *
-from typing import Any, Callable
+from typing import Any, Callable, Union
 from subtract_square_game import SubtractSquareGame
-from stonehenge import StonehengeGame
+from stonehenge import StonehengeGame, BitboardStonehengeGame
+from parallel_strategy import parallel_minimax_strategy
+from subtract_square_solver import subtract_square_strategy
+from stonehenge_database import database_strategy
+from mcts_strategy import mcts_strategy
+from proof_number import pn_strategy
+import instrumentation
+from search_session import end_session
+from ponder import Ponderer, PONDERING_STRATEGIES
 
 # TODO: Replace None with the corresponding class name for your games.
 # 'h' should map to Stonehenge.
 playable_games = {'s': SubtractSquareGame,
-                  'h': StonehengeGame}
+                  'h': StonehengeGame,
+                  'b': BitboardStonehengeGame}
 
 # TODO: Replace None with the corresponding function names for your strategies.
 # 'mr' should map to your recursive implementation of minimax while
@@ -25,7 +35,35 @@ playable_games = {'s': SubtractSquareGame,
 usable_strategies = {'i': interactive_strategy,
                      'ro': rough_outcome_strategy,
                      'mr': minimax_recursive_strategy,
-                     'mi': minimax_iterative_strategy}
+                     'mi': minimax_iterative_strategy,
+                     'ab': alphabeta_strategy,
+                     'mu': minimax_inplace_strategy,
+                     'pm': parallel_minimax_strategy,
+                     'ss': subtract_square_strategy,
+                     'db': database_strategy,
+                     'id': iterative_deepening_strategy,
+                     'mc': mcts_strategy,
+                     'pn': pn_strategy}
+
+# strategies of usable_strategies that only apply to one game: their key ->
+# the class of that game, whose subclasses they also play
+GAME_STRATEGIES = {'ss': SubtractSquareGame, 'db': StonehengeGame}
+
+
+def applies_to(strategy_key: str, game_class: type) -> bool:
+    """
+    Return whether usable_strategies[strategy_key] plays games of
+    game_class.
+
+    >>> applies_to('ss', SubtractSquareGame), applies_to('ss', StonehengeGame)
+    (True, False)
+    >>> applies_to('ab', StonehengeGame)
+    True
+    >>> applies_to('db', BitboardStonehengeGame)
+    True
+    """
+    return issubclass(game_class,
+                      GAME_STRATEGIES.get(strategy_key, game_class))
 
 
 class GameInterface:
@@ -35,7 +73,10 @@ class GameInterface:
     """
 
     def __init__(self, game: Any, p1_strategy: Callable,
-                 p2_strategy: Callable[[Any], Any]) -> None:
+                 p2_strategy: Callable[[Any], Any],
+                 is_p1_turn: Union[bool, None] = None,
+                 parameter: Union[int, None] = None,
+                 ponder: bool = False) -> None:
         """
         Initialize this GameInterface, setting its active game to game, and
         using the strategies p1_strategy for Player 1 and p2_strategy for
@@ -47,19 +88,36 @@ class GameInterface:
         :type p1_strategy:
         :param p2_strategy: The strategy for Play 2.
         :type p2_strategy:
+        :param is_p1_turn: Whether Player 1 moves first, asked if None.
+        :type is_p1_turn:
+        :param parameter: The size of the game, asked by game if None.
+        :type parameter:
+        :param ponder: Whether a minimax strategy playing a human searches
+                       during the human's turns.
+        :type ponder:
         """
-        first_player = input("Type y if player 1 is to make the first move: ")
-        is_p1_turn = False
-        if first_player.lower() == 'y':
-            is_p1_turn = True
-
-        self.game = game(is_p1_turn)
+        if is_p1_turn is None:
+            first_player = input(
+                "Type y if player 1 is to make the first move: ")
+            is_p1_turn = False
+            if first_player.lower() == 'y':
+                is_p1_turn = True
+
+        self.game = game(is_p1_turn, parameter)
         self.p1_strategy = p1_strategy
         self.p2_strategy = p2_strategy
+        self.ponderer = None
+        if ponder and interactive_strategy in (p1_strategy, p2_strategy) \
+                and (p1_strategy in PONDERING_STRATEGIES
+                     or p2_strategy in PONDERING_STRATEGIES):
+            self.ponderer = Ponderer(self.game)
 
     def play(self) -> None:
         """
         Play the game.
+        If instrumentation is enabled, the report of the search for each move
+        is printed after the move.
+        If pondering, the engine searches while the human picks a move.
         """
         current_state = self.game.current_state
 
@@ -76,12 +134,21 @@ class GameInterface:
             for move in possible_moves:
                 print(move)
 
+            current_strategy = self.p2_strategy
+            if current_state.get_current_player_name() == 'p1':
+                current_strategy = self.p1_strategy
+            if self.ponderer is not None \
+                    and current_strategy is interactive_strategy:
+                self.ponderer.start()
+
             # Pick a (legal) move.
             while not current_state.is_valid_move(move_to_make):
-                current_strategy = self.p2_strategy
-                if current_state.get_current_player_name() == 'p1':
-                    current_strategy = self.p1_strategy
-                move_to_make = current_strategy(self.game)
+                if self.ponderer is not None \
+                        and current_strategy is not interactive_strategy:
+                    move_to_make = self.ponderer.answer(self.game,
+                                                        current_strategy)
+                else:
+                    move_to_make = current_strategy(self.game)
 
             # Apply the move
             current_player_name = current_state.get_current_player_name()
@@ -92,6 +159,13 @@ class GameInterface:
             print("{} made the move {}. The game's state is now:".format(
                 current_player_name, move_to_make))
             print(current_state)
+            if instrumentation.recorder is not None:
+                print(instrumentation.recorder.report())
+                instrumentation.recorder.reset()
+
+        if self.ponderer is not None:
+            self.ponderer.stop()
+        end_session(self.game)
 
         # Print out the winner of the game
         if self.game.is_winner("p1"):
@@ -103,29 +177,38 @@ class GameInterface:
 
 
 if __name__ == '__main__':
+    # python game_interface.py --stats reports every search
+    if '--stats' in sys.argv[1:]:
+        instrumentation.enable()
+    # python game_interface.py --ponder searches during the human's turns
+    pondering = '--ponder' in sys.argv[1:]
+
     games = ", ".join(["'{}': {}".format(key, playable_games[key].__name__) if
                        playable_games[key] is not None else
                        "'{}': None".format(key) for key in playable_games])
 
-    strategies = ", ".join(["'{}': {}".format(key,
-                                              usable_strategies[key].__name__)
-                            if usable_strategies[key] is not None else
-                            "'{}': None".format(key)
-                            for key in usable_strategies])
-
     chosen_game = ''
     while chosen_game not in playable_games.keys():
         chosen_game = input(
             "Select the game you want to play ({}): ".format(games))
 
+    # only the strategies which play the chosen game are offered
+    offered = [key for key in usable_strategies
+               if applies_to(key, playable_games[chosen_game])]
+    strategies = ", ".join(["'{}': {}".format(key,
+                                              usable_strategies[key].__name__)
+                            if usable_strategies[key] is not None else
+                            "'{}': None".format(key)
+                            for key in offered])
+
     p1 = ''
     p2 = ''
 
-    while p1 not in usable_strategies.keys():
+    while p1 not in offered:
         p1 = input("Select the strategy for Player 1 ({}): ".format(strategies))
 
-    while p2 not in usable_strategies.keys():
+    while p2 not in offered:
         p2 = input("Select the strategy for Player 2 ({}): ".format(strategies))
 
     GameInterface(playable_games[chosen_game], usable_strategies[p1],
-                  usable_strategies[p2]).play()
+                  usable_strategies[p2], ponder=pondering).play()
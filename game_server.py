@@ -0,0 +1,510 @@
+"""
+An asyncio game server, which hosts many games at once over a line-based
+TCP protocol.
+
+Each request is one line: a tag chosen by the client, a command and its
+arguments, separated by spaces. Each reply is one line: the tag of its
+request, then OK and the results, or ERR and a message. The requests of a
+connection are handled concurrently, so their replies may come in any
+order, but the requests of one session are handled in the order they came.
+
+    <tag> NEW <game> <size> <strategy> <p1|p2>
+        start a session in which the client plays p1 or p2 of a game of
+        playable_games against a strategy of usable_strategies, Player 1
+        moving first; reply OK <session> <engine move or -> <status>.
+        The size is at most SIZE_LIMITS of the game, and EXACT_SIZE_LIMITS
+        for the strategies which solve the game exactly
+    <tag> MOVE <session> <move>
+        make move, and let the strategy reply;
+        reply OK <engine move or -> <status>
+    <tag> MOVES <session>
+        reply OK <the possible moves>
+    <tag> STATS [<session>]
+        reply OK <the statistics of the session, or of the server, as JSON>
+    <tag> END <session>
+        end the session; reply OK
+
+The status is playing, won, lost or draw, for the client. The sessions of
+a connection end when it closes.
+
+Strategies run in a pool of a few worker processes, and at most as many
+calls are given to the pool as it has workers, so that the event loop only
+ever waits for them and a burst of moves queues in the loop, not the pool.
+Each call in a worker process searches a game of its own, so what the
+strategies keep in search sessions from one move to the next is lost
+between the moves of a session. With --threads, strategies run in
+threads of the server instead, each session searching the same game for
+all its moves, and keep their search sessions.
+Every session records how long its moves took to answer and how much of
+that the strategy took.
+
+Run it with:
+    python game_server.py --port 7878 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple, Union
+from game_interface import playable_games, usable_strategies, applies_to
+from tournament import percentile
+
+
+# moves of all sessions whose latency is kept for the server statistics
+RECENT_MOVES = 100000
+# game key -> the largest size of a game of it the server starts
+SIZE_LIMITS = {'s': 10000, 'h': 5, 'b': 5}
+# strategies which solve the game exactly, with no time limit: the
+# alpha-beta fallbacks of 'db' and 'ss' included
+EXACT_STRATEGIES = ('mr', 'mi', 'mu', 'ab', 'pm', 'pn', 'db')
+# game key -> the largest size of a game of it the EXACT_STRATEGIES are
+# given, as they take minutes on a Stonehenge board of side 4 and run out
+# of stack beyond a Subtract Square total of about a thousand
+EXACT_SIZE_LIMITS = {'s': 1000, 'h': 3, 'b': 3}
+
+
+class ProtocolError(Exception):
+    """
+    Raised when a request cannot be carried out; its message is sent back
+    to the client.
+    """
+
+
+def _choose_move(game_key: str, parameter: int, state: Any,
+                 strategy_key: str) -> Tuple[Any, float]:
+    """
+    Return the move of usable_strategies[strategy_key] in state of a new
+    game of playable_games[game_key] of size parameter, and the seconds it
+    took. This runs in a worker process of the pool.
+    """
+    game = playable_games[game_key](
+        state.get_current_player_name() == 'p1', parameter)
+    return _choose_move_in(game, state, strategy_key)
+
+
+def _choose_move_in(game: Any, state: Any,
+                    strategy_key: str) -> Tuple[Any, float]:
+    """
+    Return the move of usable_strategies[strategy_key] in state of game,
+    and the seconds it took. This runs in a worker thread of the pool, or
+    for _choose_move in a worker process.
+    """
+    game.current_state = state
+    start = time.perf_counter()
+    move = usable_strategies[strategy_key](game)
+    return move, time.perf_counter() - start
+
+
+def latency_stats(values: List[float]) -> Dict[str, float]:
+    """
+    Return the count, mean, percentiles and maximum of values, in seconds.
+
+    >>> latency_stats([0.25, 0.5, 0.75, 1.0])['p50']
+    0.5
+    """
+    return {'count': len(values),
+            'mean': sum(values) / len(values) if values != [] else 0.0,
+            'p50': percentile(values, 0.5), 'p90': percentile(values, 0.9),
+            'p99': percentile(values, 0.99), 'max': max(values, default=0.0)}
+
+
+class Session:
+    """
+    A game between a client and a strategy.
+
+    number: the number of this session on its server
+    game_key: the key of the game in playable_games
+    parameter: the size of the game
+    strategy_key: the key of the strategy in usable_strategies
+    client: the player of the client, 'p1' or 'p2'
+    game: the game being played
+    engine_game: the game the strategy searches when it runs in a thread,
+                 kept for all the moves of the session with its search
+                 session
+    latencies: the seconds from each move of the client to its reply
+    thinking: the seconds the strategy took for each of its moves
+    """
+    number: int
+    game_key: str
+    parameter: int
+    strategy_key: str
+    client: str
+    game: Any
+    engine_game: Any
+    latencies: List[float]
+    thinking: List[float]
+    lock: asyncio.Lock
+
+    def __init__(self, number: int, game_key: str, parameter: int,
+                 strategy_key: str, client: str) -> None:
+        """
+        Initialize a Session of a new game, in which Player 1 moves first.
+
+        >>> session = Session(1, 's', 10, 'ab', 'p1')
+        >>> session.status(), session.game.current_state.current_total
+        ('playing', 10)
+        """
+        self.number = number
+        self.game_key = game_key
+        self.parameter = parameter
+        self.strategy_key = strategy_key
+        self.client = client
+        self.game = playable_games[game_key](True, parameter)
+        # a game of its own, since strategies may set its current_state
+        # while they search, and other requests of the session read game
+        self.engine_game = playable_games[game_key](True, parameter)
+        self.latencies = []
+        self.thinking = []
+        self.lock = asyncio.Lock()
+
+    def status(self) -> str:
+        """
+        Return whether the game is still being played, or whether the
+        client won or lost it or it is a draw.
+        """
+        if not self.game.is_over(self.game.current_state):
+            return 'playing'
+        other = 'p2' if self.client == 'p1' else 'p1'
+        if self.game.is_winner(self.client):
+            return 'won'
+        elif self.game.is_winner(other):
+            return 'lost'
+        return 'draw'
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the statistics of this session.
+
+        >>> Session(1, 's', 10, 'ab', 'p1').stats()['latency']['count']
+        0
+        """
+        return {'session': self.number, 'status': self.status(),
+                'moves': len(self.latencies),
+                'latency': latency_stats(self.latencies),
+                'thinking': latency_stats(self.thinking)}
+
+
+class GameServer:
+    """
+    A server of many concurrent game sessions.
+
+    executor: the pool the strategies run in
+    workers: the number of workers of executor
+    processes: whether the workers of executor are processes, not threads
+    sessions: the number of sessions open
+    started: the number of sessions ever started
+    requests: the number of requests handled
+    pending: the number of strategy calls waiting for or in the pool
+    peak_pending: the largest pending has been
+    latencies: the seconds to answer each of the last RECENT_MOVES moves
+               of any session
+    """
+    executor: Executor
+    workers: int
+    processes: bool
+    sessions: int
+    started: int
+    requests: int
+    pending: int
+    peak_pending: int
+    latencies: deque
+    _slots: asyncio.Semaphore
+
+    def __init__(self, workers: Union[int, None] = None,
+                 processes: bool = True) -> None:
+        """
+        Initialize a GameServer whose strategies run in a pool of workers
+        processes (one per CPU by default), or threads if not processes.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.processes = processes
+        if processes:
+            # workers forked from the server would inherit the sockets of
+            # its connections, and keep them open after the server closes
+            # them, so they are started by a fork server instead
+            self.executor = ProcessPoolExecutor(
+                workers, multiprocessing.get_context('forkserver'))
+        else:
+            self.executor = ThreadPoolExecutor(workers)
+        self._slots = asyncio.Semaphore(workers)
+        self.sessions = 0
+        self.started = 0
+        self.requests = 0
+        self.pending = 0
+        self.peak_pending = 0
+        self.latencies = deque(maxlen=RECENT_MOVES)
+
+    async def start(self, host: str = '127.0.0.1',
+                    port: int = 0) -> asyncio.AbstractServer:
+        """
+        Start listening on host and port (any free port if 0), and return
+        the listening server.
+        """
+        return await asyncio.start_server(self._serve, host, port)
+
+    def close(self) -> None:
+        """
+        Shut down the pool of this server.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _serve(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """
+        Handle the requests of a connection until it closes.
+        """
+        owned = {}
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if line == b'':
+                    break
+                task = asyncio.create_task(self._reply(line, owned, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks != set():
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= len(owned)
+            owned.clear()
+            writer.close()
+
+    async def _reply(self, line: bytes, owned: Dict[int, Session],
+                     writer: asyncio.StreamWriter) -> None:
+        """
+        Handle the request line of a connection whose sessions are owned,
+        and write its reply.
+        """
+        words = line.decode(errors='replace').split()
+        if words == []:
+            return
+        self.requests += 1
+        try:
+            reply = 'OK ' + await self.handle(words[1:], owned)
+        except ProtocolError as error:
+            reply = 'ERR {}'.format(error)
+        except Exception as error:
+            # a request the game or strategy fails on must not take the
+            # connection down with it
+            reply = 'ERR {}: {}'.format(type(error).__name__, error)
+        writer.write('{} {}\n'.format(words[0], reply).rstrip().encode()
+                     + b'\n')
+        await writer.drain()
+
+    async def handle(self, words: List[str],
+                     owned: Dict[int, Session]) -> str:
+        """
+        Carry out the command and arguments words for a connection whose
+        sessions are owned, and return the results to reply with.
+        Raise ProtocolError if they cannot be carried out.
+        """
+        if words == []:
+            raise ProtocolError('no command')
+        command, arguments = words[0].upper(), words[1:]
+        if command == 'NEW' and len(arguments) == 4:
+            return await self._new(owned, *arguments)
+        if command == 'STATS' and arguments == []:
+            return json.dumps(self.stats())
+        if len(arguments) not in (1, 2):
+            raise ProtocolError('bad request')
+        if not arguments[0].isdigit() or int(arguments[0]) not in owned:
+            raise ProtocolError('no session {}'.format(arguments[0]))
+        session = owned[int(arguments[0])]
+        if command == 'MOVE' and len(arguments) == 2:
+            return await self._move(session, arguments[1])
+        if len(arguments) != 1:
+            raise ProtocolError('bad request')
+        if command == 'MOVES':
+            return ' '.join(
+                [str(move)
+                 for move in session.game.current_state.get_possible_moves()])
+        if command == 'STATS':
+            return json.dumps(session.stats())
+        if command == 'END':
+            del owned[session.number]
+            self.sessions -= 1
+            return ''
+        raise ProtocolError('unknown command {}'.format(command))
+
+    async def _new(self, owned: Dict[int, Session], game_key: str,
+                   size: str, strategy_key: str, client: str) -> str:
+        """
+        Start a session owned by a connection, letting the strategy move
+        first if the client plays p2.
+        """
+        if game_key not in playable_games:
+            raise ProtocolError('no game {}'.format(game_key))
+        if strategy_key not in usable_strategies or strategy_key == 'i' or \
+                not applies_to(strategy_key, playable_games[game_key]):
+            raise ProtocolError('no strategy {} for game {}'.format(
+                strategy_key, game_key))
+        if not size.isdigit() or \
+                not 1 <= int(size) <= SIZE_LIMITS[game_key]:
+            raise ProtocolError('bad size {}'.format(size))
+        if strategy_key in EXACT_STRATEGIES and \
+                int(size) > EXACT_SIZE_LIMITS[game_key]:
+            raise ProtocolError('size {} too large for strategy {}'.format(
+                size, strategy_key))
+        if client not in ('p1', 'p2'):
+            raise ProtocolError('bad player {}'.format(client))
+        self.started += 1
+        session = Session(self.started, game_key, int(size), strategy_key,
+                          client)
+        owned[session.number] = session
+        self.sessions += 1
+        async with session.lock:
+            move = '-'
+            if client == 'p2':
+                move = str(await self._engine_move(session))
+        return '{} {} {}'.format(session.number, move, session.status())
+
+    async def _move(self, session: Session, text: str) -> str:
+        """
+        Make the move of the client given by text in session, and the reply
+        of its strategy if the game is not over.
+        """
+        start = time.perf_counter()
+        async with session.lock:
+            game = session.game
+            state = game.current_state
+            if game.is_over(state):
+                raise ProtocolError('game over')
+            if state.get_current_player_name() != session.client:
+                raise ProtocolError('not your turn')
+            move = game.str_to_move(text)
+            if not state.is_valid_move(move):
+                raise ProtocolError('bad move {}'.format(text))
+            game.current_state = state.make_move(move)
+            reply = '-'
+            if not game.is_over(game.current_state):
+                reply = str(await self._engine_move(session))
+            seconds = time.perf_counter() - start
+            session.latencies.append(seconds)
+            self.latencies.append(seconds)
+            return '{} {}'.format(reply, session.status())
+
+    async def _engine_move(self, session: Session) -> Any:
+        """
+        Make the move of the strategy of session, computed in the pool
+        without blocking the event loop, and return it.
+        """
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        if self.processes:
+            call = (_choose_move, session.game_key, session.parameter,
+                    session.game.current_state, session.strategy_key)
+        else:
+            call = (_choose_move_in, session.engine_game,
+                    session.game.current_state, session.strategy_key)
+        try:
+            async with self._slots:
+                move, seconds = await asyncio.get_running_loop(). \
+                    run_in_executor(self.executor, *call)
+        finally:
+            self.pending -= 1
+        session.thinking.append(seconds)
+        session.game.current_state = \
+            session.game.current_state.make_move(move)
+        return move
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the statistics of this server, with the latency of the moves
+        of every session so far.
+        """
+        return {'sessions': self.sessions, 'started': self.started,
+                'requests': self.requests, 'workers': self.workers,
+                'pending': self.pending, 'peak_pending': self.peak_pending,
+                'latency': latency_stats(list(self.latencies))}
+
+
+async def run_client(host: str, port: int, lines: List[str]) -> List[str]:
+    """
+    Send lines to the server at host and port one at a time, each after
+    the reply to the last one, and return the replies.
+
+    >>> async def demo() -> List[str]:
+    ...     server = GameServer(1, processes=False)
+    ...     listener = await server.start()
+    ...     port = listener.sockets[0].getsockname()[1]
+    ...     replies = await run_client('127.0.0.1', port, [
+    ...         'a NEW s 10 ab p1', 'b MOVES 1', 'c MOVE 1 4', 'd MOVE 1 1',
+    ...         'e MOVE 1 2', 'f MOVES 2', 'g NEW h 9 ab p1',
+    ...         'h NEW h 5 mr p2', 'i NEW s 4 ab p1'])
+    ...     listener.close()
+    ...     server.close()
+    ...     return replies
+    >>> for reply in asyncio.run(demo()):
+    ...     print(reply)
+    a OK 1 - playing
+    b OK 1 4 9
+    c OK 1 playing
+    d OK 4 lost
+    e ERR game over
+    f ERR no session 2
+    g ERR bad size 9
+    h ERR size 5 too large for strategy mr
+    i OK 2 - playing
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    replies = []
+    try:
+        for line in lines:
+            writer.write(line.encode() + b'\n')
+            await writer.drain()
+            replies.append((await reader.readline()).decode().rstrip('\n'))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return replies
+
+
+async def serve(host: str, port: int, workers: Union[int, None],
+                processes: bool) -> None:
+    """
+    Run a GameServer on host and port until cancelled.
+    """
+    server = GameServer(workers, processes)
+    listener = await server.start(host, port)
+    print('serving on {}'.format(', '.join(
+        str(socket.getsockname()) for socket in listener.sockets)))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv: List[str]) -> int:
+    """
+    Run a game server from the command line arguments argv.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7878)
+    parser.add_argument('--workers', type=int,
+                        help='strategy workers, one per CPU by default')
+    parser.add_argument('--threads', action='store_true',
+                        help='run strategies in threads, not processes')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers,
+                          not args.threads))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -55,6 +55,19 @@ class GameState:
         """
         raise NotImplementedError
 
+    def apply_move(self, move: Any) -> None:
+        """
+        Apply move to this GameState in place, so that it becomes the state
+        make_move(move) would return.
+        """
+        raise NotImplementedError
+
+    def undo_move(self) -> None:
+        """
+        Revert the last move applied to this GameState by apply_move.
+        """
+        raise NotImplementedError
+
     def is_valid_move(self, move: Any) -> bool:
         """
         Return whether move is a valid move for this GameState.
@@ -68,6 +81,50 @@ class GameState:
         """
         raise NotImplementedError
 
+    def state_key(self) -> Any:
+        """
+        Return a compact hashable key identifying this state, which can be
+        used to store the state's score in a transposition table.
+        """
+        return repr(self)
+
+    def __eq__(self, other: Any) -> bool:
+        """
+        Return whether self and other are states of the same type with the
+        same state_key.
+        """
+        return type(self) == type(other) and \
+            self.state_key() == other.state_key()
+
+    def __hash__(self) -> int:
+        """
+        Return the hash of the state_key of this state. A state must not be
+        changed while it is in a set or a dictionary.
+        """
+        return hash(self.state_key())
+
+    def canonical_key(self) -> Any:
+        """
+        Return a key shared by this state and every state equivalent to it
+        by a symmetry of the board.
+        """
+        return self.state_key()
+
+    def get_distinct_moves(self) -> list:
+        """
+        Return the possible moves of this state, leaving out every move whose
+        result is equivalent by symmetry to the result of an earlier move.
+        """
+        return self.get_possible_moves()
+
+    def get_move_priorities(self, moves: list) -> list:
+        """
+        Return a priority for each move in moves, from the state alone: 2
+        for a move that wins at once, 1 for a move that stops the other
+        player from gaining ground at once, and 0 otherwise.
+        """
+        return [0] * len(moves)
+
     def rough_outcome(self) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
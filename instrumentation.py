@@ -0,0 +1,254 @@
+"""
+Opt-in instrumentation of the searches in strategy.py.
+
+While a SearchRecorder is enabled, the searches report every node they
+visit, every state they find over, every score they reuse from a
+transposition table and every alpha-beta cutoff, by depth below the state
+the strategy was asked about. The calls of the state methods in
+TIMED_METHODS and of strategy.score_state_over are timed as well, each by
+its self time: the time spent in the timed calls it makes, such as
+StonehengeState.state_over inside get_possible_moves, is counted under
+their names only, so the timings add up to at most the time recorded.
+
+When nothing is enabled, recorder is None and the only cost to a search is
+checking that once per node.
+"""
+import time
+from typing import Any, Callable, Dict, List, Union
+from stonehenge_state import StonehengeState
+from subtract_square_state import SubtractSquareState
+
+# the state methods whose calls are timed while a recorder is enabled
+TIMED_METHODS = [(StonehengeState, ['make_move', 'apply_move', 'undo_move',
+                                    'get_possible_moves', 'state_over',
+                                    'rough_outcome']),
+                 (SubtractSquareState, ['make_move', 'apply_move',
+                                        'undo_move', 'get_possible_moves'])]
+
+# the enabled SearchRecorder, or None
+recorder = None
+# (owner, name, original) of every method or function replaced by enable
+_originals = []
+# the seconds spent in the timed calls made by each timed call running,
+# innermost last
+_nested = []
+
+
+class SearchRecorder:
+    """
+    The counts and timings reported by the searches since the last reset.
+
+    depths: depth -> [nodes, terminals, cache hits, cutoffs] at that depth
+    timings: name of a timed call -> [number of calls, total self seconds]
+    started: time.perf_counter() at the last reset
+    """
+    depths: Dict[int, List[int]]
+    timings: Dict[str, List[Union[int, float]]]
+    started: float
+
+    def __init__(self) -> None:
+        """
+        Initialize a SearchRecorder with nothing recorded.
+
+        >>> SearchRecorder().depths
+        {}
+        """
+        self.depths = {}
+        self.timings = {}
+        self.started = time.perf_counter()
+
+    def reset(self) -> None:
+        """
+        Forget everything recorded so far.
+
+        >>> search = SearchRecorder()
+        >>> search.node(1)
+        >>> search.reset()
+        >>> search.depths
+        {}
+        """
+        self.depths = {}
+        self.timings = {}
+        self.started = time.perf_counter()
+
+    def _counts(self, depth: int) -> List[int]:
+        """
+        Return the counts at depth, adding them if there are none yet.
+        """
+        if depth not in self.depths:
+            self.depths[depth] = [0, 0, 0, 0]
+        return self.depths[depth]
+
+    def node(self, depth: int) -> None:
+        """
+        Record a node visited at depth.
+        """
+        self._counts(depth)[0] += 1
+
+    def terminal(self, depth: int) -> None:
+        """
+        Record a state found over at depth.
+        """
+        self._counts(depth)[1] += 1
+
+    def cache_hit(self, depth: int) -> None:
+        """
+        Record a score reused from a transposition table at depth.
+        """
+        self._counts(depth)[2] += 1
+
+    def cutoff(self, depth: int) -> None:
+        """
+        Record the remaining moves of a node at depth being pruned.
+        """
+        self._counts(depth)[3] += 1
+
+    def time_call(self, name: str, seconds: float) -> None:
+        """
+        Record a call of name which took seconds, not counting the timed
+        calls it made.
+        """
+        if name not in self.timings:
+            self.timings[name] = [0, 0.0]
+        self.timings[name][0] += 1
+        self.timings[name][1] += seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Return everything recorded, with the branching factor of each depth:
+        the nodes at the next depth per node expanded at this one.
+
+        >>> search = SearchRecorder()
+        >>> search.node(1)
+        >>> search.node(2)
+        >>> search.node(2)
+        >>> search.terminal(2)
+        >>> search.as_dict()['depths']
+        [{'depth': 1, 'nodes': 1, 'terminals': 0, 'cache_hits': 0, \
+'cutoffs': 0, 'branching': 2.0}, {'depth': 2, 'nodes': 2, 'terminals': 1, \
+'cache_hits': 0, 'cutoffs': 0, 'branching': 0.0}]
+        """
+        depths = []
+        for depth in sorted(self.depths):
+            nodes, terminals, cache_hits, cutoffs = self.depths[depth]
+            expanded = nodes - terminals - cache_hits
+            below = self.depths.get(depth + 1, [0])[0]
+            depths.append({'depth': depth, 'nodes': nodes,
+                           'terminals': terminals, 'cache_hits': cache_hits,
+                           'cutoffs': cutoffs,
+                           'branching': below / expanded if expanded > 0
+                                        else 0.0})
+        return {'seconds': time.perf_counter() - self.started,
+                'depths': depths,
+                'timings': {name: {'calls': calls, 'seconds': seconds}
+                            for name, (calls, seconds)
+                            in sorted(self.timings.items())}}
+
+    def report(self) -> str:
+        """
+        Return everything recorded as a table of text.
+        """
+        stats = self.as_dict()
+        lines = ["{:>5} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+            'depth', 'nodes', 'terminals', 'cache hits', 'cutoffs',
+            'branching')]
+        for row in stats['depths']:
+            lines.append("{depth:5} {nodes:10} {terminals:10} "
+                         "{cache_hits:10} {cutoffs:10} "
+                         "{branching:9.2f}".format(**row))
+        lines.append("total nodes {} in {:.4f}s".format(
+            sum(row['nodes'] for row in stats['depths']), stats['seconds']))
+        for name, timing in stats['timings'].items():
+            lines.append("{:36} {:10} calls {:9.4f}s".format(
+                name, timing['calls'], timing['seconds']))
+        return '\n'.join(lines)
+
+
+def _timed(name: str, function: Callable) -> Callable:
+    """
+    Return a function which calls function and records the time it took,
+    less that of the timed calls it made, under name with the enabled
+    recorder.
+    """
+    def timed(*args: Any, **kwargs: Any) -> Any:
+        """
+        Call the timed function.
+        """
+        _nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            inner = _nested.pop()
+            if _nested != []:
+                _nested[-1] += seconds
+            if recorder is not None:
+                recorder.time_call(name, seconds - inner)
+    timed.__name__ = function.__name__
+    timed.__doc__ = function.__doc__
+    return timed
+
+
+def enable() -> SearchRecorder:
+    """
+    Start recording the searches and timing the state methods in
+    TIMED_METHODS and strategy.score_state_over, and return the recorder.
+    If already enabled, return the recorder in use.
+    """
+    global recorder
+    import strategy
+    if recorder is not None:
+        return recorder
+    recorder = SearchRecorder()
+    for cls, names in TIMED_METHODS:
+        for name in names:
+            original = cls.__dict__[name]
+            _originals.append((cls, name, original))
+            setattr(cls, name, _timed(cls.__name__ + '.' + name, original))
+    _originals.append((strategy, 'score_state_over',
+                       strategy.score_state_over))
+    strategy.score_state_over = _timed('score_state_over',
+                                       strategy.score_state_over)
+    return recorder
+
+
+def disable() -> Union[SearchRecorder, None]:
+    """
+    Stop recording, restore the timed methods and return the recorder that
+    was enabled, if any.
+
+    >>> search = enable()
+    >>> StonehengeState(True, 2).make_move('A').state_over()
+    False
+    >>> sorted(search.timings)
+    ['StonehengeState.make_move', 'StonehengeState.state_over']
+
+    The minimax searches record the moves they skip after a win as
+    cutoffs, and the timings of nested calls do not overlap:
+    >>> from stonehenge import StonehengeGame
+    >>> from strategy import minimax_recursive_strategy
+    >>> search.reset()
+    >>> minimax_recursive_strategy(StonehengeGame(True, 2))
+    'A'
+    >>> stats = search.as_dict()
+    >>> sum(row['cutoffs'] for row in stats['depths']) > 0
+    True
+    >>> timed = [timing['seconds'] for timing in stats['timings'].values()]
+    >>> sum(timed) <= stats['seconds']
+    True
+    >>> disable() is search, recorder
+    (True, None)
+    """
+    global recorder
+    search = recorder
+    recorder = None
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+    return search
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
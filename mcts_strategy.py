@@ -0,0 +1,171 @@
+"""
+A Monte Carlo Tree Search strategy.
+"""
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, List, Union
+from strategy import score_state_over
+
+# statistics of the last search of mcts_strategy, replaced with
+# stats_lock held, as searches may run in several threads
+last_stats = {}
+stats_lock = threading.Lock()
+
+
+class MCTSNode:
+    """
+    A node of a Monte Carlo search tree.
+
+    state: the state of the game at this node
+    move: the move that led from the parent to this node
+    parent: the parent of this node, or None for the root
+    children: the expanded children of this node
+    untried: the moves of state not expanded yet
+    wins: total reward of the playouts through this node, for the player
+          who made move
+    visits: number of playouts through this node
+    """
+    state: Any
+    move: Any
+    parent: Union["MCTSNode", None]
+    children: List["MCTSNode"]
+    untried: list
+    wins: float
+    visits: int
+
+    def __init__(self, state: Any, move: Any = None,
+                 parent: Union["MCTSNode", None] = None) -> None:
+        """
+        Initialize a MCTSNode for state.
+        """
+        self.state = state
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = state.get_possible_moves()
+        self.wins = 0.0
+        self.visits = 0
+
+    def select_child(self, exploration: float) -> "MCTSNode":
+        """
+        Return the child of this node with the highest UCT value.
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda child: child.wins / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+
+def _winning_move(game: Any, state: Any) -> Any:
+    """
+    Return a move of state after which game is over, or None.
+    """
+    for move in state.get_possible_moves():
+        state.apply_move(move)
+        over = game.is_over(state)
+        state.undo_move()
+        if over:
+            return move
+    return None
+
+
+def _playout(game: Any, state: Any, guided: bool) -> str:
+    """
+    Play random moves from state until the game is over and return the
+    name of the winner, or '' for a tie. If guided, a move that ends the
+    game is always played when there is one. state is unchanged when this
+    returns.
+    """
+    applied = 0
+    while not game.is_over(state):
+        move = _winning_move(game, state) if guided else None
+        if move is None:
+            move = random.choice(state.get_possible_moves())
+        state.apply_move(move)
+        applied += 1
+    score = score_state_over(game, state)
+    mover = 'p2' if state.p1_turn else 'p1'
+    if score == 1:
+        winner = mover
+    elif score == -1:
+        winner = state.get_current_player_name()
+    else:
+        winner = ''
+    for _ in range(applied):
+        state.undo_move()
+    return winner
+
+
+def mcts_search(game: Any, playouts: Union[int, None] = None,
+                time_limit: Union[float, None] = None, guided: bool = True,
+                exploration: float = 1.4) -> (Any, Dict[str, Any]):
+    """
+    Return the most visited move of a UCT search from game.current_state
+    and the statistics of the search. The search stops after playouts
+    playouts or time_limit seconds, whichever comes first, and after 1000
+    playouts if neither is given, but always runs at least one playout.
+    """
+    if playouts is None and time_limit is None:
+        playouts = 1000
+    start = time.perf_counter()
+    root = MCTSNode(game.current_state)
+    count = 0
+    while count == 0 or (playouts is None or count < playouts) and \
+            (time_limit is None or time.perf_counter() - start < time_limit):
+        node = root
+        # selection
+        while node.untried == [] and node.children != []:
+            node = node.select_child(exploration)
+        # expansion
+        if node.untried != []:
+            move = node.untried.pop(random.randrange(len(node.untried)))
+            node.children.append(MCTSNode(node.state.make_move(move),
+                                          move, node))
+            node = node.children[-1]
+        # simulation
+        winner = _playout(game, node.state, guided)
+        # backpropagation
+        while node is not None:
+            node.visits += 1
+            if winner == '':
+                node.wins += 0.5
+            elif winner != node.state.get_current_player_name():
+                node.wins += 1
+            node = node.parent
+        count += 1
+    seconds = time.perf_counter() - start
+    best = max(root.children, key=lambda child: child.visits)
+    return best.move, {'playouts': count, 'seconds': seconds,
+                       'playouts_per_second': count / seconds
+                       if seconds > 0 else float('inf')}
+
+
+def mcts_strategy(game: Any, playouts: Union[int, None] = None,
+                  time_limit: Union[float, None] = None,
+                  guided: bool = True) -> Any:
+    """
+    Obtain a move by Monte Carlo Tree Search with UCT selection and random
+    playouts, which take a move that ends the game whenever one exists if
+    guided. The statistics of the search are kept in last_stats.
+
+    >>> from stonehenge import StonehengeGame
+    >>> game = StonehengeGame(True, 2)
+    >>> for move in ['D', 'A', 'B']:
+    ...     game.current_state = game.current_state.make_move(move)
+    >>> mcts_strategy(game, playouts=50, guided=False)
+    'G'
+    >>> last_stats['playouts']
+    50
+    """
+    move, stats = mcts_search(game, playouts, time_limit, guided)
+    with stats_lock:
+        last_stats.clear()
+        last_stats.update(stats)
+    return move
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
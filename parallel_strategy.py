@@ -0,0 +1,254 @@
+"""
+A root-parallel minimax strategy, which scores the subtrees below the root
+in a pool of processes.
+
+The pool of each number of workers is started by the first search using
+it and kept for the next ones, so that its workers are started once and
+keep their transposition tables; the pools are shut down when the process
+that started them exits. Every search has a number of its own, which it
+writes into a slot shared with the workers while it runs; when it returns,
+it clears its slot, and its subtrees still being scored stop at the next
+state they visit. Searches may run at once in several threads.
+"""
+import copy
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Union
+from strategy import inplace_score, minimax_inplace_strategy, \
+    score_state_over
+from transposition_table import BoundedTranspositionTable, \
+    TranspositionTable
+import move_ordering
+
+# the number of slots shared with the workers: searches running at once
+# beyond it stop each other's subtrees, which are then scored in the
+# process of their search instead
+SEARCH_SLOTS = 64
+
+# number of workers -> the pool of that many workers, once started
+_pools = {}
+# the process _pools and _running belong to: a process forked from it
+# starts its own
+_owner = None
+# slot -> the number of the search running in it, or -1, shared with the
+# workers; made with the first pool
+_running = None
+# the number of the next search
+_next_number = 0
+# held while starting a search or the pools
+_lock = threading.Lock()
+# the transposition table of a worker process, shared by all of its tasks
+_worker_table = None
+
+
+class SearchStopped(Exception):
+    """
+    Raised inside a worker when the search its subtree belongs to is over.
+    """
+
+
+def _init_worker(running: Any) -> None:
+    """
+    Give a new worker process an empty transposition table and the shared
+    slots of the searches running.
+    """
+    global _worker_table, _running
+    _worker_table = BoundedTranspositionTable()
+    _running = running
+
+
+def _solve(game: Any, state: Any, number: int) -> Union[int, None]:
+    """
+    Get the final score for a move in a worker process, or None if search
+    number number is over before it is found.
+    """
+    is_over = game.is_over
+
+    def stoppable_is_over(visited: Any) -> bool:
+        """
+        Return whether visited is over, unless the search is.
+        """
+        if _running[number % SEARCH_SLOTS] != number:
+            raise SearchStopped
+        return is_over(visited)
+    game.is_over = stoppable_is_over
+    try:
+        return inplace_score(game, state, _worker_table, 1,
+                             move_ordering.new_orderer())
+    except SearchStopped:
+        return None
+
+
+def _get_pool(workers: Union[int, None]) -> ProcessPoolExecutor:
+    """
+    Return the pool of workers processes (one per CPU if None), starting it
+    if there is none of that size yet. Call with _lock held.
+    """
+    global _owner, _running
+    if _owner != os.getpid():
+        # the pools of the process this one was forked from are not ours
+        _pools.clear()
+        _owner = os.getpid()
+        _running = multiprocessing.RawArray('i', [-1] * SEARCH_SLOTS)
+        # a process joins its child processes as it exits, so the pools
+        # are shut down first, even in a worker process, where atexit
+        # functions are not called; and before the queues of the pools
+        # are closed, at exit priority 10, so that their workers are told
+        # to stop
+        multiprocessing.util.Finalize(None, shutdown_pool, exitpriority=20)
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(_running,))
+    return _pools[workers]
+
+
+def shutdown_pool() -> None:
+    """
+    Stop the subtrees being scored and shut down the pools, if any.
+    """
+    if _owner != os.getpid():
+        return
+    for slot in range(SEARCH_SLOTS):
+        _running[slot] = -1
+    while _pools != {}:
+        _pools.popitem()[1].shutdown(wait=True, cancel_futures=True)
+
+
+def _split(game: Any, state: Any, depth: int, executor: ProcessPoolExecutor,
+           futures: List, states: List, number: int) \
+        -> Union[tuple, int, List]:
+    """
+    Return a 1-tuple of the score of state if it is over, otherwise submit
+    the subtrees depth moves below state to executor and return the nested
+    list of children of state, where each subtree is the index of its
+    future in futures and of its state in states. The subtrees belong to
+    search number number.
+    """
+    if game.is_over(state):
+        return (score_state_over(game, state),)
+    if depth == 0:
+        futures.append(executor.submit(_solve, game, state, number))
+        states.append(state)
+        return len(futures) - 1
+    return [_split(game, state.make_move(move), depth - 1, executor, futures,
+                   states, number)
+            for move in state.get_possible_moves()]
+
+
+def _score_stopped(game: Any, done: set, futures: List,
+                   states: List) -> None:
+    """
+    Replace each future of futures in done which was stopped, by a search
+    running in the same slot, with a future of the score of its state,
+    found in this process.
+    """
+    for index, future in enumerate(futures):
+        if future in done and future.result() is None:
+            scored = Future()
+            scored.set_result(inplace_score(
+                copy.copy(game), states[index], TranspositionTable(), 1,
+                move_ordering.new_orderer()))
+            futures[index] = scored
+
+
+def _resolve(node: Union[int, List, tuple], futures: List) \
+        -> Union[int, None]:
+    """
+    Return the score of node built by _split, or None if some of the
+    futures it depends on are not done yet.
+    """
+    # node is a state that is over
+    if isinstance(node, tuple):
+        return node[0]
+    # node is the index of a future
+    if isinstance(node, int):
+        if not futures[node].done():
+            return None
+        return futures[node].result()
+    best = -1
+    for child in node:
+        score = _resolve(child, futures)
+        if score is None:
+            return None
+        best = max(best, score)
+    return (-1) * best
+
+
+def parallel_minimax_strategy(game: Any, workers: Union[int, None] = None,
+                              split_depth: int = 1) -> Any:
+    """
+    Obtain the same move as minimax_recursive_strategy by scoring the
+    subtrees split_depth moves below the root in a pool of workers
+    processes (one per CPU by default).
+    As soon as the move is known, the subtrees not yet started are
+    cancelled and those being scored stop.
+
+    >>> from stonehenge import StonehengeGame
+    >>> from stonehenge_retrograde import RetrogradeSolution, check_strategy
+    >>> check_strategy(RetrogradeSolution(2), parallel_minimax_strategy,
+    ...                StonehengeGame, 10)
+    []
+    """
+    global _next_number
+    current_state = game.current_state
+    possible_moves = current_state.get_distinct_moves()
+    with _lock:
+        executor = _get_pool(workers)
+        number = _next_number
+        _next_number += 1
+        running = _running
+        running[number % SEARCH_SLOTS] = number
+    futures = []
+    states = []
+    try:
+        roots = [_split(game, current_state.make_move(move),
+                        split_depth - 1, executor, futures, states, number)
+                 for move in possible_moves]
+        pending = set(futures)
+        while True:
+            scores = [_resolve(root, futures) for root in roots]
+            for score in scores:
+                if score is None:
+                    break
+                if score == 1:
+                    return possible_moves[scores.index(1)]
+            else:
+                if 0 in scores:
+                    return possible_moves[scores.index(0)]
+                return possible_moves[0]
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            _score_stopped(game, done, futures, states)
+    finally:
+        with _lock:
+            if running[number % SEARCH_SLOTS] == number:
+                running[number % SEARCH_SLOTS] = -1
+        for future in futures:
+            future.cancel()
+
+
+def measure_speedup(game: Any, workers: Union[int, None] = None,
+                    split_depth: int = 1) -> Dict[str, Any]:
+    """
+    Return the moves chosen and the wall time taken by the serial
+    minimax_inplace_strategy and by parallel_minimax_strategy for game,
+    and the speedup of the latter.
+    """
+    start = time.perf_counter()
+    serial_move = minimax_inplace_strategy(game)
+    serial_time = time.perf_counter() - start
+    start = time.perf_counter()
+    parallel_move = parallel_minimax_strategy(game, workers, split_depth)
+    parallel_time = time.perf_counter() - start
+    return {'serial_move': serial_move, 'parallel_move': parallel_move,
+            'serial_time': serial_time, 'parallel_time': parallel_time,
+            'speedup': serial_time / parallel_time}
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,152 @@
+"""
+Pondering: searching during the opponent's turn.
+
+While a human player types a move, a Ponderer searches, in a background
+thread, the position after each of their likely replies, as the minimax
+strategies would search it on the engine's next turn. The scores it solves
+go into the table of the game's search session, so when the human's move
+arrives the engine answers at once if that reply was already searched, and
+otherwise searches on from whatever subtrees were solved.
+"""
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable, Union
+import move_ordering
+from search_session import session_for
+from strategy import (minimax_inplace_strategy, minimax_iterative_strategy,
+                      minimax_recursive_strategy, inplace_score)
+
+# strategies whose move a Ponderer finds ahead of time, since they solve
+# positions exactly with the table of the game's session
+PONDERING_STRATEGIES = (minimax_recursive_strategy,
+                        minimax_iterative_strategy,
+                        minimax_inplace_strategy)
+
+
+class PonderStopped(Exception):
+    """
+    Raised inside a pondering search when it is told to stop.
+    """
+
+
+class Ponderer:
+    """
+    A background search of the replies to the state of a game, filling the
+    table of its search session.
+
+    game: the game being played
+    answers: state_key of a state after a reply -> the move the minimax
+             strategies choose there
+    searched: the number of replies searched to the end
+    """
+    game: Any
+    answers: Dict[Hashable, Any]
+    searched: int
+    _stop: threading.Event
+    _thread: Union[threading.Thread, None]
+
+    def __init__(self, game: Any) -> None:
+        """
+        Initialize a Ponderer of game which is not pondering.
+
+        >>> from stonehenge import StonehengeGame
+        >>> ponderer = Ponderer(StonehengeGame(True, 2))
+        >>> ponderer.answers, ponderer.searched
+        ({}, 0)
+        """
+        self.game = game
+        self.answers = {}
+        self.searched = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start searching the replies to game.current_state in the background.
+        The game is not changed by the search, and can be read while it
+        runs.
+        """
+        self.stop()
+        table = session_for(self.game).table
+        # a copy of the game, so that the search can set its current_state
+        # when scoring states that are over, and can be told to stop at any
+        # state it visits
+        shadow = copy.copy(self.game)
+        is_over = shadow.is_over
+        stop = self._stop
+
+        def stoppable_is_over(state: Any) -> bool:
+            """
+            Return whether state is over, unless the search must stop.
+            """
+            if stop.is_set():
+                raise PonderStopped
+            return is_over(state)
+        shadow.is_over = stoppable_is_over
+        stop.clear()
+        self._thread = threading.Thread(
+            target=self._ponder, args=(shadow, self.game.current_state, table),
+            daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background search, if any, and wait for it to finish.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _ponder(self, game: Any, state: Any, table: Any) -> None:
+        """
+        Search the state after each reply to state, likeliest first.
+        """
+        replies = move_ordering.MoveOrderer().order(
+            state, state.get_possible_moves(), 0)
+        try:
+            for reply in replies:
+                after = state.make_move(reply)
+                if game.is_over(after):
+                    continue
+                self.answers[after.state_key()] = \
+                    _minimax_move(game, after, table)
+                self.searched += 1
+        except PonderStopped:
+            pass
+
+    def answer(self, game: Any, strategy: Callable) -> Any:
+        """
+        Stop pondering and return the move of strategy for game: at once if
+        it was found while pondering, and otherwise by calling strategy,
+        which goes on from the scores solved so far.
+        """
+        self.stop()
+        key = game.current_state.state_key()
+        if strategy in PONDERING_STRATEGIES and key in self.answers:
+            return self.answers[key]
+        return strategy(game)
+
+
+def _minimax_move(game: Any, state: Any, table: Any) -> Any:
+    """
+    Return the move the minimax strategies choose in state, storing the
+    scores solved in table.
+    """
+    moves = state.get_distinct_moves()
+    orderer = move_ordering.new_orderer()
+    tie_move = None
+    for move in moves:
+        score = inplace_score(game, state.make_move(move), table, 1, orderer)
+        if score == 1:
+            return move
+        elif score == 0 and tie_move is None:
+            tie_move = move
+    if tie_move is not None:
+        return tie_move
+    return moves[0]
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,244 @@
+"""
+A proof-number search strategy, which proves or disproves that the player
+to move wins by always working on the move that needs the least work to
+settle the question.
+
+The search is depth-first proof-number search (df-pn): the proof and
+disproof numbers of the states searched are kept in a bounded table
+instead of a tree, so states reached by different orders of moves are
+searched once, and memory stays within the table's size however long the
+search runs.
+"""
+import heapq
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+# proof or disproof number of a settled state
+INFINITY = 1 << 40
+# the threshold of a child is this much above the second best child, so
+# that the search does not switch back and forth between two children
+EPSILON = 0.25
+# the part of a full table dropped at once to make room
+GC_FRACTION = 0.25
+
+# statistics of the last search of pn_strategy, replaced with stats_lock
+# held, as searches may run in several threads
+last_stats = {}
+stats_lock = threading.Lock()
+
+
+class NodeLimitReached(Exception):
+    """
+    Raised when a search has visited as many states as it may.
+    """
+
+
+class ProofNumberSearch:
+    """
+    A df-pn search of whether the player to move in a state wins, with
+    numbers for the player to move of each state: its proof number is the
+    least number of states to settle to prove that the player wins, and its
+    disproof number the least to prove that they lose.
+    The state is searched in place and is unchanged between calls.
+
+    game: the game the state belongs to
+    state: the state at the root of the search
+    nodes: the number of states visited
+    node_limit: the number of visits after which the search gives up
+    table_limit: the number of states the table may hold
+    table: state_key -> (proof number, disproof number)
+    work: state_key -> the number of states visited searching it, for each
+          state in table
+    """
+    game: Any
+    state: Any
+    nodes: int
+    node_limit: int
+    table_limit: int
+    table: Dict[Any, Tuple[int, int]]
+    work: Dict[Any, int]
+
+    def __init__(self, game: Any, state: Any, node_limit: int,
+                 table_limit: int) -> None:
+        """
+        Initialize a search of state of game.
+        Precondition: not game.is_over(state)
+        """
+        self.game = game
+        self.state = state
+        self.node_limit = node_limit
+        self.table_limit = table_limit
+        self.nodes = 0
+        self.table = {}
+        self.work = {}
+
+    def _store(self, key: Any, numbers: Tuple[int, int],
+               work: int = 0) -> None:
+        """
+        Store numbers for key, found by visiting work states. When the table
+        is full, the GC_FRACTION of its entries found with the least work
+        are dropped first: they are the cheapest to find again, while the
+        states on the path being searched, whose work includes all the work
+        below them, are kept.
+
+        >>> from stonehenge import StonehengeGame
+        >>> game = StonehengeGame(True, 2)
+        >>> search = ProofNumberSearch(game, game.current_state, 10, 4)
+        >>> for work, key in enumerate(['a', 'b', 'c', 'd', 'e']):
+        ...     search._store(key, (1, 1), work)
+        >>> sorted(search.table)
+        ['b', 'c', 'd', 'e']
+        """
+        table = self.table
+        if key not in table and len(table) >= self.table_limit:
+            count = max(1, int(len(table) * GC_FRACTION))
+            for old in heapq.nsmallest(count, table, key=self.work.get):
+                del table[old]
+                del self.work[old]
+        table[key] = numbers
+        self.work[key] = work
+
+    def _children(self, moves: list) -> List[Any]:
+        """
+        Return the state_key of the state after each of moves, storing the
+        numbers of those settled at once: when the game is over, or when
+        rough_outcome() tells that the player to move can win at once or
+        that every move lets the other player win at once.
+        """
+        keys = []
+        state = self.state
+        for move in moves:
+            state.apply_move(move)
+            key = state.state_key()
+            if key not in self.table:
+                if self.game.is_over(state):
+                    # the player who just moved won
+                    self._store(key, (INFINITY, 0))
+                else:
+                    outcome = state.rough_outcome()
+                    if outcome == state.WIN:
+                        self._store(key, (0, INFINITY))
+                    elif outcome == state.LOSE:
+                        self._store(key, (INFINITY, 0))
+            state.undo_move()
+            keys.append(key)
+        return keys
+
+    def _search(self, key: Any, moves: list, proof_limit: int,
+                disproof_limit: int) -> None:
+        """
+        Search self.state, whose key is key and whose moves are moves, until
+        its proof number reaches proof_limit or its disproof number reaches
+        disproof_limit.
+        Raise NodeLimitReached once node_limit states are visited.
+        """
+        self.nodes += 1
+        if self.nodes > self.node_limit:
+            raise NodeLimitReached
+        # the work of earlier searches of this state counts too
+        start = self.nodes - self.work.get(key, 0)
+        keys = self._children(moves)
+        while True:
+            numbers = [self.table.get(child, (1, 1)) for child in keys]
+            # proving a win takes disproving one child, and disproving it
+            # takes proving every child
+            proof = min([disproof for _, disproof in numbers])
+            disproof = min(sum([child_proof for child_proof, _ in numbers]),
+                           INFINITY)
+            self._store(key, (proof, disproof), self.nodes - start)
+            if proof >= proof_limit or disproof >= disproof_limit:
+                return
+            best = second = INFINITY
+            best_index = 0
+            for i in range(len(numbers)):
+                if numbers[i][1] < best:
+                    best, second, best_index = numbers[i][1], best, i
+                elif numbers[i][1] < second:
+                    second = numbers[i][1]
+            self.state.apply_move(moves[best_index])
+            try:
+                self._search(keys[best_index],
+                             self.state.get_possible_moves(),
+                             disproof_limit - disproof
+                             + numbers[best_index][0],
+                             min(proof_limit, int(second * (1 + EPSILON)) + 1))
+            finally:
+                self.state.undo_move()
+
+    def run(self) -> Tuple[int, int]:
+        """
+        Search until the state is settled or node_limit states are visited,
+        and return its numbers.
+        """
+        key = self.state.state_key()
+        try:
+            self._search(key, self.state.get_distinct_moves(), INFINITY,
+                         INFINITY)
+        except NodeLimitReached:
+            pass
+        return self.table.get(key, (1, 1))
+
+    def best_move(self) -> Any:
+        """
+        Return the first move proved to win, the first move if every move is
+        proved to lose, and otherwise the move closest to being proved to
+        win.
+        """
+        moves = self.state.get_distinct_moves()
+        keys = self._children(moves)
+        disproofs = [self.table.get(key, (1, 1))[1] for key in keys]
+        if min(disproofs) == INFINITY:
+            return moves[0]
+        return moves[disproofs.index(min(disproofs))]
+
+
+def pn_search(game: Any, node_limit: int = 1000000,
+              table_limit: int = 1000000) -> (Any, Dict[str, Any]):
+    """
+    Return the move chosen by a df-pn search from game.current_state of at
+    most node_limit states with a table of at most table_limit states, and
+    the statistics of the search: whether the player to move wins, the
+    proof and disproof numbers, the states visited and the seconds taken.
+
+    >>> from stonehenge import StonehengeGame
+    >>> move, stats = pn_search(StonehengeGame(True, 2))
+    >>> move, stats['result'], stats['proof'], stats['disproof']
+    ('A', 'win', 0, inf)
+    """
+    start = time.perf_counter()
+    search = ProofNumberSearch(game, game.current_state, node_limit,
+                               table_limit)
+    proof, disproof = search.run()
+    if proof == 0:
+        result = 'win'
+    elif disproof == 0:
+        result = 'loss'
+    else:
+        result = 'unknown'
+    stats = {'result': result,
+             'proof': float('inf') if proof == INFINITY else proof,
+             'disproof': float('inf') if disproof == INFINITY else disproof,
+             'nodes': search.nodes, 'table_size': len(search.table),
+             'seconds': time.perf_counter() - start}
+    return search.best_move(), stats
+
+
+def pn_strategy(game: Any, node_limit: int = 200000,
+                table_limit: int = 1000000) -> Any:
+    """
+    Obtain a move by df-pn search: a winning move if one is proved within
+    node_limit states, the first move if every move is proved to lose,
+    and otherwise the move closest to being proved to win. The statistics
+    of the search are kept in last_stats.
+    """
+    move, stats = pn_search(game, node_limit, table_limit)
+    with stats_lock:
+        last_stats.clear()
+        last_stats.update(stats)
+    return move
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
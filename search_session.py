@@ -0,0 +1,178 @@
+"""
+Search sessions, which keep what the searches of a game found from one turn
+to the next.
+
+Each game being played has one session, found by session_for(game). A
+search from a state within two moves of the state the last search started
+from (after the player's own move, and after the opponent's reply) re-roots
+the session there and keeps its table: the subtree under the new state was
+already searched, so its scores are reused instead of searched again. A
+search from any other state, such as that of a new game, starts the session
+afresh. Sessions are dropped together with their games.
+"""
+import weakref
+from typing import Any, Dict, Hashable, Set, Tuple, Union
+from transposition_table import TranspositionTable, \
+    BoundedTranspositionTable
+
+# game -> its SearchSession
+_sessions = weakref.WeakKeyDictionary()
+# the memory budget of the table of each new session, in megabytes, or
+# None for a table without a limit
+memory_mb = None
+
+
+class SearchSession:
+    """
+    The solved scores and best moves found by the searches of one game.
+
+    root: the state_key of the state the last search started from, or None
+          before the first search
+    table: the solved scores of the states searched
+    bounded_tables: the name of a search -> the megabytes of the table it
+                    keeps the bounds it finds in, and that table
+    best_moves: state_key -> the move found best by the last search of it
+    searches: the number of searches started in this session
+    reuses: the number of those which kept what earlier searches found
+    """
+    root: Union[Hashable, None]
+    table: Union[TranspositionTable, BoundedTranspositionTable]
+    bounded_tables: Dict[str, Tuple[float, BoundedTranspositionTable]]
+    best_moves: Dict[Hashable, Any]
+    searches: int
+    reuses: int
+    _followers: Set[Hashable]
+
+    def __init__(self, budget_mb: Union[float, None] = None) -> None:
+        """
+        Initialize a SearchSession which has not searched yet, whose table
+        takes at most budget_mb megabytes if given.
+
+        >>> session = SearchSession()
+        >>> session.root, len(session.table), session.searches
+        (None, 0, 0)
+        >>> SearchSession(1).table.capacity
+        87380
+        """
+        self.root = None
+        if budget_mb is None:
+            self.table = TranspositionTable()
+        else:
+            self.table = BoundedTranspositionTable(budget_mb)
+        self.bounded_tables = {}
+        self.best_moves = {}
+        self.searches = 0
+        self.reuses = 0
+        self._followers = set()
+
+    def reroot(self, state: Any) -> None:
+        """
+        Start a search from state, keeping what earlier searches found if
+        state is the last root or within two moves of it, and forgetting it
+        otherwise.
+
+        >>> from stonehenge_state import StonehengeState
+        >>> session = SearchSession()
+        >>> state = StonehengeState(True, 2)
+        >>> session.reroot(state)
+        >>> session.table.put('solved', 1)
+        >>> session.reroot(state.make_move('A').make_move('B'))
+        >>> len(session.table), session.reuses
+        (1, 1)
+        >>> session.reroot(StonehengeState(False, 2))
+        >>> len(session.table), session.reuses
+        (0, 1)
+        """
+        key = state.state_key()
+        self.searches += 1
+        if self.root is not None and (key == self.root
+                                      or key in self._followers):
+            self.reuses += 1
+        else:
+            self.table.clear()
+            for _, table in self.bounded_tables.values():
+                table.clear()
+            self.best_moves.clear()
+        if key != self.root:
+            self.root = key
+            self._followers = _followers(state)
+
+    def bounded_table(self, name: str,
+                      memory_mb: float) -> BoundedTranspositionTable:
+        """
+        Return the table of memory_mb megabytes the search named name keeps
+        the bounds it finds in, which is made the first time it is asked
+        for and kept, like table, from one search to the next.
+
+        >>> session = SearchSession()
+        >>> table = session.bounded_table('ab', 1)
+        >>> table is session.bounded_table('ab', 1), table.capacity
+        (True, 87380)
+        >>> session.bounded_table('ab', 2) is table
+        False
+        """
+        if name not in self.bounded_tables or \
+                self.bounded_tables[name][0] != memory_mb:
+            self.bounded_tables[name] = (memory_mb,
+                                         BoundedTranspositionTable(memory_mb))
+        return self.bounded_tables[name][1]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the search counters of this session and of its table.
+
+        >>> SearchSession().stats()
+        {'searches': 0, 'reuses': 0, 'hits': 0, 'misses': 0, 'size': 0}
+        """
+        stats = {'searches': self.searches, 'reuses': self.reuses}
+        stats.update(self.table.stats())
+        return stats
+
+
+def _followers(state: Any) -> Set[Hashable]:
+    """
+    Return the state_keys of the states one or two moves after state.
+
+    >>> from subtract_square_state import SubtractSquareState
+    >>> keys = _followers(SubtractSquareState(True, 5))
+    >>> sorted(keys) == sorted([(False, 4), (False, 1), (True, 3),
+    ...                         (True, 0)])
+    True
+    """
+    keys = set()
+    for move in state.get_possible_moves():
+        child = state.make_move(move)
+        keys.add(child.state_key())
+        for reply in child.get_possible_moves():
+            keys.add(child.make_move(reply).state_key())
+    return keys
+
+
+def session_for(game: Any) -> SearchSession:
+    """
+    Return the session of game, re-rooted at game.current_state. A new
+    session's table is limited to memory_mb megabytes if it is set.
+
+    >>> from stonehenge import StonehengeGame
+    >>> game = StonehengeGame(True, 2)
+    >>> session_for(game) is session_for(game)
+    True
+    """
+    session = _sessions.get(game)
+    if session is None:
+        session = SearchSession(memory_mb)
+        _sessions[game] = session
+    session.reroot(game.current_state)
+    return session
+
+
+def end_session(game: Any) -> None:
+    """
+    Forget the session of game, if it has one.
+    """
+    _sessions.pop(game, None)
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -37,7 +37,8 @@ class StateTree:
 
     def __eq__(self, other: Any) -> bool:
         """
-        Check whether two StateTrees are equal
+        Check whether two StateTrees are equal, comparing their states by
+        state_key instead of by their drawings.
 
         >>> root1 = StateTree(StonehengeState(True, 1))
         >>> root2 = StateTree(StonehengeState(True, 1))
@@ -48,7 +49,7 @@ class StateTree:
         False
         """
         return (type(self) == type(other)
-                and repr(self.state) == repr(other.state)
+                and self.state == other.state
                 and self.score == other.score
                 and self.children == other.children)
 
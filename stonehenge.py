@@ -4,21 +4,27 @@ An implementation of Stonehenge.
 
 from game import Game
 from stonehenge_state import StonehengeState
+from stonehenge_bitboard import BitboardStonehengeState
 
 
 class StonehengeGame(Game):
     """
     Abstract class for a game to be played with two players.
+
+    state_class: the class of the states of the game
     """
+    state_class = StonehengeState
 
-    def __init__(self, p1_starts: bool) -> None:
+    def __init__(self, p1_starts: bool, side_length: int = None) -> None:
         """
         Initialize this Game, using p1_starts to find who the first player is.
+        The user is asked for the side length if it is not given.
         Precondition: side length <= 5
 
         """
-        side_length = int(input("Enter the side length of the board: "))
-        self.current_state = StonehengeState(p1_starts, side_length)
+        if side_length is None:
+            side_length = int(input("Enter the side length of the board: "))
+        self.current_state = self.state_class(p1_starts, side_length)
 
     def get_instructions(self) -> str:
         """
@@ -42,20 +48,10 @@ class StonehengeGame(Game):
         Return whether player has won the game.
         Precondition: player is 'p1' or 'p2'.
         """
-        count1 = 0
-        count2 = 0
-        total = 0
-        for ley in self.current_state.ley_lines:
-            if ley == '1':
-                count1 += 1
-            elif ley == '2':
-                count2 += 1
-            total += 1
-        if player == 'p1':
-            return self.is_over(self.current_state) and 2 * count1 >= total
-        elif player == 'p2':
-            return self.is_over(self.current_state) and 2 * count2 >= total
-        return False
+        if player not in ('p1', 'p2'):
+            return False
+        total = (self.current_state.side_length + 1) * 3
+        return 2 * self.current_state.count(player) >= total
 
     def str_to_move(self, string: str)-> str:
         """
@@ -67,6 +63,17 @@ class StonehengeGame(Game):
         return string.strip()
 
 
+class BitboardStonehengeGame(StonehengeGame):
+    """
+    Stonehenge played on BitboardStonehengeStates.
+
+    >>> game = BitboardStonehengeGame(True, 2)
+    >>> type(game.current_state).__name__
+    'BitboardStonehengeState'
+    """
+    state_class = BitboardStonehengeState
+
+
 if __name__ == "__main__":
     from python_ta import check_all
     check_all(config="a2_pyta.txt")
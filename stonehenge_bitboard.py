@@ -0,0 +1,353 @@
+"""
+An implementation of a state for Stonehenge backed by integer bitmasks.
+
+"""
+from typing import List, Dict, Tuple
+from game_state import GameState
+from stonehenge_state import StonehengeState, get_cell_layout
+from draw import draw_hexagon
+
+# side length -> (cell index of each letter, ley line mask of each cell,
+#                 cell mask of each ley line, capacity of each ley line)
+_LAYOUTS = {}
+
+
+def get_layout(side_length: int) -> Tuple[Dict[str, int], List[int],
+                                          List[int], List[int]]:
+    """
+    Return the bitmask layout of a board with side_length, computing it
+    only the first time it is asked for.
+    >>> letters, cell_lines, line_cells, capacities = get_layout(1)
+    >>> letters
+    {'A': 0, 'B': 1, 'C': 2}
+    >>> [bin(mask) for mask in cell_lines]
+    ['0b100101', '0b11001', '0b10110']
+    >>> line_cells[0], capacities
+    (3, [2, 1, 2, 1, 2, 1])
+    """
+    if side_length not in _LAYOUTS:
+        letters, positions, capacities = get_cell_layout(side_length)
+        cell_lines = [0] * len(letters)
+        line_cells = [0] * len(capacities)
+        for letter in letters:
+            for line in positions[letter]:
+                cell_lines[letters[letter]] |= 1 << line
+                line_cells[line] |= 1 << letters[letter]
+        _LAYOUTS[side_length] = (letters, cell_lines, line_cells, capacities)
+    return _LAYOUTS[side_length]
+
+
+class BitboardStonehengeState(GameState):
+    """
+    The state of a game at a certain point in time, stored as one bitmask
+    of claimed cells and one bitmask of captured ley lines per player.
+
+    side_length - the side length of the board
+    p1_cells, p2_cells - bit i is set if cell i is claimed by the player
+    p1_lines, p2_lines - bit j is set if ley line j is captured by the player
+    _history - the bitmasks before each move applied by apply_move
+    """
+    CELL = StonehengeState.CELL
+    side_length: int
+    p1_cells: int
+    p2_cells: int
+    p1_lines: int
+    p2_lines: int
+    _history: List[Tuple[int, int, int, int]]
+
+    def __init__(self, is_p1_turn: bool, side_length: int) -> None:
+        """
+        Initialize this game state and set the current player based on
+        is_p1_turn.
+        >>> stone = BitboardStonehengeState(True, 3)
+        >>> stone.cells
+        ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L']
+        >>> stone.ley_lines
+        ['@', '@', '@', '@', '@', '@', '@', '@', '@', '@', '@', '@']
+        """
+        super().__init__(is_p1_turn)
+        self.side_length = side_length
+        self.p1_cells = 0
+        self.p2_cells = 0
+        self.p1_lines = 0
+        self.p2_lines = 0
+        self._history = []
+
+    @property
+    def cells(self) -> List[str]:
+        """
+        Return the cells of this board in the format of StonehengeState.
+        """
+        cells = []
+        for i in range(len(get_layout(self.side_length)[1])):
+            if self.p1_cells >> i & 1:
+                cells.append('1')
+            elif self.p2_cells >> i & 1:
+                cells.append('2')
+            else:
+                cells.append(self.CELL[i])
+        return cells
+
+    @property
+    def ley_lines(self) -> List[str]:
+        """
+        Return the ley lines of this board in the format of StonehengeState.
+        """
+        ley_lines = []
+        for j in range(len(get_layout(self.side_length)[2])):
+            if self.p1_lines >> j & 1:
+                ley_lines.append('1')
+            elif self.p2_lines >> j & 1:
+                ley_lines.append('2')
+            else:
+                ley_lines.append('@')
+        return ley_lines
+
+    def __str__(self) -> str:
+        """
+        Return a string representation of the current state of the game.
+        """
+        return draw_hexagon(self.side_length, self.cells, self.ley_lines)
+
+    def __repr__(self) -> str:
+        """
+        Return a representation of this state (which can be used for
+        equality testing).
+        >>> repr(BitboardStonehengeState(True, 2).make_move('C')) == \\
+        ...     repr(StonehengeState(True, 2).make_move('C'))
+        True
+        """
+        return "P1's Turn: {}, Side Length: {} \n".format(self.p1_turn,
+                                                          self.side_length) \
+               + self.__str__()
+
+    def state_key(self) -> Tuple:
+        """
+        Return a compact hashable key identifying this state.
+        """
+        return (self.p1_turn, self.p1_cells, self.p2_cells,
+                self.p1_lines, self.p2_lines)
+
+    def get_possible_moves(self) -> list:
+        """
+        Return all possible moves that can be applied to this state.
+
+        >>> stone = BitboardStonehengeState(True, 1)
+        >>> stone.get_possible_moves()
+        ['A', 'B', 'C']
+        >>> stone.make_move('A').get_possible_moves()
+        []
+        """
+        if self.state_over():
+            return []
+        taken = self.p1_cells | self.p2_cells
+        return [self.CELL[i]
+                for i in range(len(get_layout(self.side_length)[1]))
+                if not taken >> i & 1]
+
+    def make_move(self, move: str) -> "BitboardStonehengeState":
+        """
+        Return the GameState that results from applying move to this GameState.
+        >>> stone = BitboardStonehengeState(True, 2).make_move('A')
+        >>> stone.cells
+        ['1', 'B', 'C', 'D', 'E', 'F', 'G']
+        >>> stone.ley_lines
+        ['1', '@', '@', '@', '@', '@', '@', '@', '1']
+        """
+        new_state = BitboardStonehengeState(not self.p1_turn,
+                                            self.side_length)
+        new_state.p1_cells, new_state.p2_cells, new_state.p1_lines, \
+            new_state.p2_lines = self._masks_after(move)
+        return new_state
+
+    def _masks_after(self, move: str) -> Tuple[int, int, int, int]:
+        """
+        Return the cell and ley line bitmasks of both players after move.
+        """
+        letters, cell_lines, line_cells, capacities = \
+            get_layout(self.side_length)
+        index = letters[move]
+        cells = (self.p1_cells if self.p1_turn else self.p2_cells) \
+            | 1 << index
+        lines = self.p1_lines if self.p1_turn else self.p2_lines
+        free_lines = cell_lines[index] & ~(self.p1_lines | self.p2_lines)
+        while free_lines:
+            line = free_lines & -free_lines
+            j = line.bit_length() - 1
+            if 2 * bin(cells & line_cells[j]).count('1') >= capacities[j]:
+                lines |= line
+            free_lines ^= line
+        if self.p1_turn:
+            return cells, self.p2_cells, lines, self.p2_lines
+        return self.p1_cells, cells, self.p1_lines, lines
+
+    def apply_move(self, move: str) -> None:
+        """
+        Apply move to this state in place, so that it becomes the state
+        make_move(move) would return. It can be reverted by undo_move.
+        >>> stone = BitboardStonehengeState(True, 2)
+        >>> after = stone.make_move('A')
+        >>> stone.apply_move('A')
+        >>> stone.state_key() == after.state_key()
+        True
+        """
+        self._history.append((self.p1_cells, self.p2_cells,
+                              self.p1_lines, self.p2_lines))
+        self.p1_cells, self.p2_cells, self.p1_lines, self.p2_lines = \
+            self._masks_after(move)
+        self.p1_turn = not self.p1_turn
+
+    def undo_move(self) -> None:
+        """
+        Revert the last move applied to this state by apply_move.
+        >>> stone = BitboardStonehengeState(True, 2)
+        >>> before = stone.state_key()
+        >>> stone.apply_move('A')
+        >>> stone.undo_move()
+        >>> stone.state_key() == before
+        True
+
+        The strategies which search by applying and undoing moves work on
+        this state as well:
+        >>> from stonehenge import StonehengeGame
+        >>> from strategy import (minimax_recursive_strategy,
+        ...                       minimax_iterative_strategy,
+        ...                       minimax_inplace_strategy)
+        >>> game = StonehengeGame(True, 2)
+        >>> stone = BitboardStonehengeState(True, 2).make_move('A')
+        >>> game.current_state = stone.make_move('D')
+        >>> [strategy(game) for strategy in (minimax_recursive_strategy,
+        ...                                  minimax_iterative_strategy,
+        ...                                  minimax_inplace_strategy)]
+        ['B', 'B', 'B']
+        >>> game.current_state.cells
+        ['1', 'B', 'C', '2', 'E', 'F', 'G']
+        """
+        self.p1_cells, self.p2_cells, self.p1_lines, self.p2_lines = \
+            self._history.pop()
+        self.p1_turn = not self.p1_turn
+
+    def count(self, player: str) -> int:
+        """
+        Count the number of ley lines claimed by player.
+        >>> stone = BitboardStonehengeState(True, 2)
+        >>> stone = stone.make_move('A').make_move('B').make_move('G')
+        >>> stone.count('p1'), stone.count('p2')
+        (5, 1)
+        """
+        if player == 'p1':
+            return bin(self.p1_lines).count('1')
+        return bin(self.p2_lines).count('1')
+
+    def state_over(self) -> bool:
+        """
+        Return whether or not this game is over.
+        >>> BitboardStonehengeState(True, 1).make_move('A').state_over()
+        True
+        """
+        total = (self.side_length + 1) * 3
+        return 2 * self.count('p1') >= total or 2 * self.count('p2') >= total
+
+    def rough_outcome(self) -> float:
+        """
+        Return an estimate in interval [LOSE, WIN] of best outcome the current
+        player can guarantee from state self.
+        The moves are looked at through the bitmasks of the ley lines either
+        player captures with one more cell, without making them.
+
+        >>> stone = BitboardStonehengeState(True, 2).make_move('A')
+        >>> stone.rough_outcome()
+        0
+        >>> stone.make_move('E').make_move('F').rough_outcome()
+        -1
+        """
+        total = (self.side_length + 1) * 3
+        if self.state_over():
+            cur, other = ('p1', 'p2') if self.p1_turn else ('p2', 'p1')
+            if 2 * self.count(cur) >= total:
+                if 2 * self.count(other) < total:
+                    return self.WIN
+            else:
+                return self.LOSE
+            return self.DRAW
+        cell_lines = get_layout(self.side_length)[1]
+        own, other = (self.p1_cells, self.p2_cells) if self.p1_turn \
+            else (self.p2_cells, self.p1_cells)
+        other_count = self.count('p2' if self.p1_turn else 'p1')
+        free_cells = (1 << len(cell_lines)) - 1 & ~(own | other)
+        own_threats = self._threat_lines(own)
+        if self._winning_cells(self.count(self.get_current_player_name()),
+                               own_threats, free_cells):
+            return self.WIN
+        other_threats = self._threat_lines(other)
+        replies = self._winning_cells(other_count, other_threats, free_cells)
+        while free_cells:
+            cell = free_cells & -free_cells
+            # the replies that still win after this move, which takes their
+            # cell or the ley lines they need
+            rest = replies & ~cell
+            captured = cell_lines[cell.bit_length() - 1] & own_threats
+            if captured:
+                rest = self._winning_cells(other_count,
+                                           other_threats & ~captured, rest)
+            if not rest:
+                return self.DRAW
+            free_cells ^= cell
+        return self.LOSE
+
+    def win_in_one(self) -> int:
+        """
+        Return whether the current player of a state that is not over
+        can win immediately.
+        >>> BitboardStonehengeState(True, 1).win_in_one()
+        1
+        >>> BitboardStonehengeState(True, 2).win_in_one()
+        0
+        """
+        cells = self.p1_cells if self.p1_turn else self.p2_cells
+        free_cells = (1 << len(get_layout(self.side_length)[1])) - 1 \
+            & ~(self.p1_cells | self.p2_cells)
+        if self._winning_cells(self.count(self.get_current_player_name()),
+                               self._threat_lines(cells), free_cells):
+            return 1
+        return 0
+
+    def _threat_lines(self, cells: int) -> int:
+        """
+        Return the bitmask of the ley lines not captured yet which the
+        player who claimed cells captures by claiming one more of their
+        cells.
+        >>> stone = BitboardStonehengeState(True, 2).make_move('B')
+        >>> bin(stone._threat_lines(stone.p1_cells))
+        '0b111001100'
+        """
+        line_cells, capacities = get_layout(self.side_length)[2:]
+        captured = self.p1_lines | self.p2_lines
+        threats = 0
+        for j, line in enumerate(line_cells):
+            if not captured >> j & 1 and \
+                    2 * (bin(cells & line).count('1') + 1) >= capacities[j]:
+                threats |= 1 << j
+        return threats
+
+    def _winning_cells(self, count: int, threats: int, candidates: int) -> int:
+        """
+        Return the bitmask of the cells in candidates with which a player
+        holding count ley lines, who captures the ley lines in threats with
+        one more cell, wins.
+        """
+        cell_lines = get_layout(self.side_length)[1]
+        total = (self.side_length + 1) * 3
+        winning = 0
+        while candidates:
+            cell = candidates & -candidates
+            gain = bin(cell_lines[cell.bit_length() - 1] & threats).count('1')
+            if 2 * (count + gain) >= total:
+                winning |= cell
+            candidates ^= cell
+        return winning
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,273 @@
+"""
+A database of solved Stonehenge positions, stored on disk and read through
+mmap.
+
+A database file starts with a header of the magic bytes b'SHDB', the side
+length and the number of positions. It is followed by the sorted position
+codes as unsigned 64-bit integers and the score of each position for its
+current player as a signed byte, both little-endian.
+
+The strategy never builds a database, as building side 3 takes a while:
+until the database of a side length is built, with
+    python stonehenge_database.py --build 1 2 3
+the strategy falls back to alpha-beta on boards of that side length.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, List, Union
+from stonehenge_state import StonehengeState
+from stonehenge_bitboard import BitboardStonehengeState
+from strategy import alphabeta_strategy
+
+MAGIC = b'SHDB'
+HEADER = struct.Struct('<4sBxxxQ')
+CODE = struct.Struct('<Q')
+# largest side length whose positions fit in a 64-bit code
+MAX_SIDE_LENGTH = 3
+
+# side length -> opened database, shared by every call of database_strategy
+# and added to with _databases_lock held
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def encode_position(state: Any) -> int:
+    """
+    Return the code of a Stonehenge state: the claimed cells of p1 and p2,
+    then the captured ley lines of p1 and p2, one bit each, then whether it
+    is p1's turn.
+    >>> encode_position(StonehengeState(True, 1))
+    262144
+    >>> encode_position(StonehengeState(True, 1).make_move('A'))
+    2369
+    """
+    code = 0
+    shift = 0
+    for marks in (state.cells, state.ley_lines):
+        for player in ('1', '2'):
+            for mark in marks:
+                if mark == player:
+                    code |= 1 << shift
+                shift += 1
+    return code | int(state.p1_turn) << shift
+
+
+def _solve(state: StonehengeState, scores: Dict[int, int]) -> int:
+    """
+    Return the score of state for its current player, storing the score of
+    every position reachable from state in scores.
+    """
+    code = encode_position(state)
+    if code not in scores:
+        if state.state_over():
+            # the player who just moved won
+            scores[code] = -1
+        else:
+            best = -1
+            for move in state.get_possible_moves():
+                state.apply_move(move)
+                best = max(best, (-1) * _solve(state, scores))
+                state.undo_move()
+            scores[code] = best
+    return scores[code]
+
+
+def build_database(side_length: int, path: str) -> int:
+    """
+    Solve every position reachable on a board with side_length, whichever
+    player starts, and write them to a database file at path.
+    Return the number of positions written.
+    The file is written under another name and then renamed to path, so
+    that a process which opened the file at path never sees it partly
+    written.
+    Precondition: side_length <= MAX_SIDE_LENGTH
+
+    >>> directory = tempfile.TemporaryDirectory()
+    >>> path = os.path.join(directory.name, 'stonehenge_1.db')
+    >>> build_database(1, path)
+    8
+    >>> oct(os.stat(path).st_mode & 0o777)
+    '0o644'
+    >>> database = StonehengeDatabase(path, 1)
+    >>> database.score(StonehengeState(True, 1))
+    1
+    >>> database.close()
+    >>> StonehengeDatabase(path, 2)  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: ... is a database of side length 1, not 2
+    >>> directory.cleanup()
+    """
+    scores = {}
+    _solve(StonehengeState(True, side_length), scores)
+    _solve(StonehengeState(False, side_length), scores)
+    codes = sorted(scores)
+    descriptor, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, side_length, len(codes)))
+            file.write(struct.pack('<{}Q'.format(len(codes)), *codes))
+            file.write(struct.pack('<{}b'.format(len(codes)),
+                                   *[scores[code] for code in codes]))
+            # mkstemp makes the file readable by its owner only, and the
+            # database is shared by everyone's processes
+            os.fchmod(file.fileno(), 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return len(codes)
+
+
+class StonehengeDatabase:
+    """
+    A database file of solved Stonehenge positions, opened with mmap.
+
+    side_length: the side length of the board of the positions
+    size: the number of positions
+    """
+    side_length: int
+    size: int
+    _file: Any
+    _map: mmap.mmap
+
+    def __init__(self, path: str,
+                 side_length: Union[int, None] = None) -> None:
+        """
+        Open the database file at path, which must hold the positions of a
+        board with side_length if it is given.
+        Raise ValueError if it does not, or is not a whole database.
+        """
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError("{} is not a Stonehenge database".format(path))
+        magic, self.side_length, self.size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or \
+                len(self._map) != HEADER.size + self.size * (CODE.size + 1):
+            self.close()
+            raise ValueError("{} is not a Stonehenge database".format(path))
+        if side_length is not None and side_length != self.side_length:
+            self.close()
+            raise ValueError(
+                "{} is a database of side length {}, not {}".format(
+                    path, self.side_length, side_length))
+
+    def close(self) -> None:
+        """
+        Close the database file.
+        """
+        self._map.close()
+        self._file.close()
+
+    def score(self, state: Any) -> Union[int, None]:
+        """
+        Return the score of state for its current player, or None if state
+        is not in this database.
+        """
+        code = encode_position(state)
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            found = CODE.unpack_from(self._map,
+                                     HEADER.size + middle * CODE.size)[0]
+            if found == code:
+                return struct.unpack_from(
+                    '<b', self._map,
+                    HEADER.size + self.size * CODE.size + middle)[0]
+            elif found < code:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+
+def default_path(side_length: int) -> str:
+    """
+    Return the path of the database for side_length next to this module.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'stonehenge_{}.db'.format(side_length))
+
+
+def open_database(side_length: int) -> Union[StonehengeDatabase, None]:
+    """
+    Return the database for side_length at its default path, opened once
+    per process, or None if it is missing or not valid.
+    Precondition: side_length <= MAX_SIDE_LENGTH
+    """
+    with _databases_lock:
+        if side_length not in _databases:
+            try:
+                _databases[side_length] = StonehengeDatabase(
+                    default_path(side_length), side_length)
+            except (OSError, ValueError):
+                # looked for again by the next move, in case it was built
+                return None
+        return _databases[side_length]
+
+
+def database_strategy(game: Any) -> Any:
+    """
+    Obtain the same move as minimax_recursive_strategy by looking up the
+    scores of the moves in the database for the side length of the board.
+    Boards whose database is not built, boards larger than MAX_SIDE_LENGTH,
+    and games other than Stonehenge, fall back to alphabeta_strategy.
+
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> database_strategy(SubtractSquareGame(True, 20))
+    1
+    """
+    current_state = game.current_state
+    if not isinstance(current_state, (StonehengeState,
+                                      BitboardStonehengeState)):
+        return alphabeta_strategy(game)
+    side_length = current_state.side_length
+    if side_length > MAX_SIDE_LENGTH:
+        return alphabeta_strategy(game)
+    database = open_database(side_length)
+    if database is None:
+        return alphabeta_strategy(game)
+    possible_moves = current_state.get_possible_moves()
+    tie_move = None
+    for move in possible_moves:
+        score = (-1) * database.score(current_state.make_move(move))
+        if score == 1:
+            return move
+        elif score == 0 and tie_move is None:
+            tie_move = move
+    if tie_move is not None:
+        return tie_move
+    return possible_moves[0]
+
+
+def main(argv: List[str]) -> int:
+    """
+    Build the databases named by the command line arguments argv, or check
+    this module with python_ta if there are none.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--build', type=int, nargs='+', default=[],
+                        metavar='SIDE_LENGTH',
+                        choices=range(1, MAX_SIDE_LENGTH + 1),
+                        help='side lengths to build the databases of')
+    args = parser.parse_args(argv)
+    if args.build == []:
+        from python_ta import check_all
+        check_all(config="a2_pyta.txt")
+    for side_length in args.build:
+        path = default_path(side_length)
+        print("{}: {} positions".format(
+            path, build_database(side_length, path)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,191 @@
+"""
+A retrograde solver for Stonehenge, which solves every position of a small
+board layer by layer instead of searching forward from one position.
+
+Positions are numbered by encode_position of stonehenge_database: bits for
+the cells of p1 and p2, then for the ley lines of p1 and p2, then whether it
+is p1's turn. Layer k holds the sorted codes of the positions reachable
+with k claimed cells. The layers are found going forward from the empty
+boards, and then scored going backward from the last layer, each layer
+with a few array operations per cell.
+"""
+import random
+from typing import Any, Callable, List, Tuple
+import numpy as np
+from stonehenge_bitboard import get_layout
+from stonehenge_database import encode_position
+from stonehenge_state import StonehengeState
+
+
+class RetrogradeSolution:
+    """
+    The scores of every position reachable on a board, for the player to
+    move: 1 if that player wins with best play and -1 if they lose.
+    Stonehenge has no draws, since a full board always has a winner.
+
+    side_length: the side length of the board
+    codes: the sorted codes of the positions of each layer
+    scores: the scores of the positions of each layer, as in codes
+    """
+    side_length: int
+    codes: List[np.ndarray]
+    scores: List[np.ndarray]
+
+    def __init__(self, side_length: int) -> None:
+        """
+        Solve every position reachable on a board with side_length, whoever
+        starts.
+        Precondition: side_length <= 3, so that the codes fit in 64 bits
+
+        >>> solution = RetrogradeSolution(1)
+        >>> [len(codes) for codes in solution.codes]
+        [2, 6, 0, 0]
+        >>> solution.score(StonehengeState(True, 1))
+        1
+        """
+        self.side_length = side_length
+        letters, cell_lines, line_cells, capacities = get_layout(side_length)
+        cells, lines = len(letters), len(capacities)
+        self._shifts = (0, cells, 2 * cells, 2 * cells + lines)
+        self._turn = np.uint64(1 << (2 * cells + 2 * lines))
+        self._line_cells = [np.uint64(mask) for mask in line_cells]
+        self._cell_lines = [[line for line in range(lines)
+                             if cell_lines[cell] >> line & 1]
+                            for cell in range(cells)]
+        self._capacities = capacities
+        start = [encode_position(StonehengeState(p1_turn, side_length))
+                 for p1_turn in (True, False)]
+        self.codes = [np.array(sorted(start), dtype=np.uint64)]
+        for _ in range(cells):
+            self.codes.append(self._next_layer(self.codes[-1]))
+        self.scores = [None] * (cells + 1)
+        for k in range(cells, -1, -1):
+            self.scores[k] = self._score_layer(k)
+
+    def _field(self, codes: np.ndarray, field: int) -> np.ndarray:
+        """
+        Return the cells of p1 (field 0) or p2 (1), or the ley lines of p1
+        (2) or p2 (3), of each code in codes as bitmasks.
+        """
+        width = self._shifts[1] if field < 2 else len(self._capacities)
+        return codes >> np.uint64(self._shifts[field]) & \
+            np.uint64((1 << width) - 1)
+
+    def _over(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Return whether the game is over at each code in codes.
+        """
+        total = len(self._capacities)
+        return (2 * np.bitwise_count(self._field(codes, 2)) >= total) | \
+               (2 * np.bitwise_count(self._field(codes, 3)) >= total)
+
+    def _children(self, codes: np.ndarray, cell: int) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the indices in codes of the positions not over in which cell
+        is unclaimed, and the codes after the player to move claims cell.
+        """
+        bit = np.uint64(1 << cell)
+        claimed = self._field(codes, 0) | self._field(codes, 1)
+        where = np.flatnonzero(((claimed & bit) == 0) & ~self._over(codes))
+        parents = codes[where]
+        p1_turn = (parents & self._turn) != 0
+        # the player to move: field of their cells and of their ley lines
+        cells_field = np.where(p1_turn, 0, 1).astype(np.uint64)
+        children = parents | (bit << cells_field * np.uint64(self._shifts[1]))
+        lines_shift = np.where(p1_turn, self._shifts[2],
+                               self._shifts[3]).astype(np.uint64)
+        player_cells = np.where(p1_turn, self._field(children, 0),
+                                self._field(children, 1))
+        owned = self._field(children, 2) | self._field(children, 3)
+        for line in self._cell_lines[cell]:
+            line_bit = np.uint64(1 << line)
+            count = np.bitwise_count(player_cells & self._line_cells[line])
+            captures = ((owned & line_bit) == 0) & \
+                (2 * count >= self._capacities[line])
+            children = np.where(captures, children | line_bit << lines_shift,
+                                children)
+        return where, children ^ self._turn
+
+    def _next_layer(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Return the sorted codes of the positions one move after those in
+        codes.
+        """
+        found = [self._children(codes, cell)[1]
+                 for cell in range(len(self._cell_lines))]
+        return np.unique(np.concatenate(found))
+
+    def _score_layer(self, k: int) -> np.ndarray:
+        """
+        Return the scores of the positions of layer k, whose children in
+        layer k + 1 are already scored.
+        """
+        codes = self.codes[k]
+        # the player who just moved won, so the player to move lost
+        scores = np.full(len(codes), -1, dtype=np.int8)
+        if k == len(self.codes) - 1:
+            return scores
+        for cell in range(len(self._cell_lines)):
+            where, children = self._children(codes, cell)
+            child_scores = self.scores[k + 1][
+                np.searchsorted(self.codes[k + 1], children)]
+            np.maximum.at(scores, where, -child_scores)
+        return scores
+
+    def score(self, state: StonehengeState) -> int:
+        """
+        Return the score of state for its current player.
+        Precondition: state is on a board with side_length
+        """
+        k = len(state.cells) - sum([cell.isalpha() for cell in state.cells])
+        code = np.uint64(encode_position(state))
+        i = int(np.searchsorted(self.codes[k], code))
+        return int(self.scores[k][i])
+
+    def size(self) -> int:
+        """
+        Return the number of positions solved.
+
+        >>> RetrogradeSolution(2).size()
+        4270
+        """
+        return sum([len(codes) for codes in self.codes])
+
+
+def check_strategy(solution: RetrogradeSolution, strategy: Callable,
+                   game_class: type, positions: int = 50,
+                   seed: int = 0) -> List[Tuple[Any, Any]]:
+    """
+    Return the (state_key, move) of every position, among positions random
+    ones on the board of solution, where strategy picks a losing move while
+    a winning one exists.
+
+    >>> from stonehenge import StonehengeGame
+    >>> from strategy import minimax_inplace_strategy
+    >>> check_strategy(RetrogradeSolution(2), minimax_inplace_strategy,
+    ...                StonehengeGame, 20)
+    []
+    """
+    rng = random.Random(seed)
+    mistakes = []
+    for _ in range(positions):
+        state = StonehengeState(rng.random() < 0.5, solution.side_length)
+        for _ in range(rng.randrange(len(state.cells))):
+            if state.state_over():
+                break
+            state = state.make_move(rng.choice(state.get_possible_moves()))
+        if state.state_over():
+            continue
+        game = game_class(state.p1_turn, solution.side_length)
+        game.current_state = state
+        move = strategy(game)
+        if solution.score(state) == 1 and \
+                solution.score(state.make_move(move)) == 1:
+            mistakes.append((state.state_key(), move))
+    return mistakes
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
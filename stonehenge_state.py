@@ -6,6 +6,120 @@ from typing import List, Dict, Tuple
 from game_state import GameState
 from draw import draw_hexagon
 
+# side length -> (cell index of each letter, ley lines of each letter,
+#                 capacity of each ley line)
+_LAYOUTS = {}
+# side length -> list of (cell permutation, ley line permutation)
+_SYMMETRIES = {}
+# side length -> cell indices of each ley line
+_LINE_CELLS = {}
+
+
+def get_cell_layout(side_length: int) -> Tuple[Dict[str, int],
+                                               Dict[str, Tuple], List[int]]:
+    """
+    Return the index and (row, down_left, down_right) ley lines of every
+    cell and the capacity of every ley line of a board with side_length.
+    The layout is computed only the first time it is asked for.
+    >>> indices, positions, capacities = get_cell_layout(2)
+    >>> indices['F'], positions['F']
+    (5, (2, 7, 3))
+    >>> capacities
+    [2, 3, 2, 2, 3, 2, 2, 3, 2]
+    """
+    if side_length not in _LAYOUTS:
+        total_cell = side_length * (side_length + 5) // 2
+        indices = {}
+        positions = {}
+        capacities = [0] * (side_length + 1) * 3
+        for i in range(total_cell):
+            letter = StonehengeState.CELL[i]
+            indices[letter] = i
+            positions[letter] = _compute_position(side_length, i)
+            for line in positions[letter]:
+                capacities[line] += 1
+        _LAYOUTS[side_length] = (indices, positions, capacities)
+    return _LAYOUTS[side_length]
+
+
+def get_line_cells(side_length: int) -> List[List[int]]:
+    """
+    Return the indices of the cells of every ley line of a board with
+    side_length.
+    >>> get_line_cells(1)
+    [[0, 1], [2], [0, 2], [1], [1, 2], [0]]
+    """
+    if side_length not in _LINE_CELLS:
+        indices, positions, capacities = get_cell_layout(side_length)
+        line_cells = [[] for _ in capacities]
+        for letter in sorted(indices, key=indices.get):
+            for line in positions[letter]:
+                line_cells[line].append(indices[letter])
+        _LINE_CELLS[side_length] = line_cells
+    return _LINE_CELLS[side_length]
+
+
+def get_symmetries(side_length: int) -> List[Tuple[List[int], List[int]]]:
+    """
+    Return the rotations and reflections of a board with side_length as
+    pairs of permutations, where cell i is moved to cell_perm[i] and ley
+    line j to line_perm[j]. The identity comes first.
+    Each cell is located by its position along the three directions of ley
+    lines, and a symmetry permutes the directions, possibly reversing all
+    of them, as long as every cell lands on a cell.
+    >>> len(get_symmetries(1)), len(get_symmetries(2)), len(get_symmetries(3))
+    (6, 12, 6)
+    >>> get_symmetries(1)[1]
+    ([1, 0, 2], [0, 1, 4, 5, 2, 3])
+    """
+    if side_length not in _SYMMETRIES:
+        indices, positions = get_cell_layout(side_length)[:2]
+        size = side_length + 1
+        coords = {}
+        for letter in indices:
+            row, down_left, down_right = positions[letter]
+            coords[(row, down_right - size, down_left - 2 * size)] = \
+                indices[letter]
+        symmetries = []
+        for flip in (False, True):
+            for order in [(0, 1, 2), (0, 2, 1), (1, 0, 2),
+                          (1, 2, 0), (2, 0, 1), (2, 1, 0)]:
+                cell_perm = [0] * len(coords)
+                for coord in coords:
+                    image = tuple(side_length - coord[d] if flip
+                                  else coord[d] for d in order)
+                    if image not in coords:
+                        break
+                    cell_perm[coords[coord]] = coords[image]
+                else:
+                    line_perm = [0] * size * 3
+                    for d in range(3):
+                        for k in range(size):
+                            line_perm[order[d] * size + k] = \
+                                d * size + (side_length - k if flip else k)
+                    symmetries.append((cell_perm, line_perm))
+        _SYMMETRIES[side_length] = symmetries
+    return _SYMMETRIES[side_length]
+
+
+def _compute_position(side_length: int, index: int) -> Tuple:
+    """
+    Find the (row, down_left, down_right) ley lines of the cell at index.
+    >>> _compute_position(3, 10)
+    (3, 9, 5)
+    """
+    row = 0
+    i = 2
+    while index - i >= 0 and i <= side_length + 1:
+        index = index - i
+        i += 1
+        row += 1
+    if row == side_length:
+        index += 1
+    down_left = (side_length + 1) * 3 - index - 1
+    down_right = (side_length + 1) * 2 - 1 - (row + 1 - index)
+    return (row, down_left, down_right)
+
 
 class StonehengeState(GameState):
     """
@@ -31,8 +145,19 @@ class StonehengeState(GameState):
         super().__init__(is_p1_turn)
         self.side_length = side_length
         self.ley_lines = ['@'] * (self.side_length + 1) * 3
+        # number of ley lines captured by p1 and p2, kept up to date by
+        # change_claim and undo_move
+        self.captured = [None, 0, 0]
         self.cells = []
         self.claims = self._claim_ley_line()
+        self._history = []
+        self._key = None
+        # counters of the ley lines one cell away from capture, computed
+        # when first needed and then kept up to date by apply_move and
+        # undo_move: see _count_threats
+        self._finishing = None
+        self._threat_counts = None
+        self._near_captured = None
         total_cell = self.side_length * (self.side_length + 5) // 2
         for i in range(total_cell):
             self.cells.append(self.CELL[i])
@@ -42,14 +167,17 @@ class StonehengeState(GameState):
         Initialize a dictionary recording the number of '1' and '2'
         in each ley line. Doctest is in init method.
         """
+        capacities = get_cell_layout(self.side_length)[2]
         claims = {}
         for i in range(self.side_length):
-            claims[i] = [i + 2, 0, 0]
-            claims[i + self.side_length + 1] = [i + 2, 0, 0]
-            claims[i + (self.side_length + 1) * 2] = [i + 2, 0, 0]
-        claims[self.side_length] = [self.side_length, 0, 0]
-        claims[self.side_length * 2 + 1] = [self.side_length, 0, 0]
-        claims[self.side_length * 3 + 2] = [self.side_length, 0, 0]
+            claims[i] = [capacities[i], 0, 0]
+            claims[i + self.side_length + 1] = \
+                [capacities[i + self.side_length + 1], 0, 0]
+            claims[i + (self.side_length + 1) * 2] = \
+                [capacities[i + (self.side_length + 1) * 2], 0, 0]
+        for i in range(self.side_length, len(capacities),
+                       self.side_length + 1):
+            claims[i] = [capacities[i], 0, 0]
         return claims
 
     def __str__(self) -> str:
@@ -88,9 +216,78 @@ class StonehengeState(GameState):
         """
         new_state = StonehengeState(not self.p1_turn, self.side_length)
         new_state.cells = self.change_cell(move)
-        new_state.claims, new_state.ley_lines = self.change_claims(move)
+        new_state.captured = self.captured[:]
+        new_state.claims, new_state.ley_lines = \
+            self.change_claims(move, new_state.captured)
         return new_state
 
+    def apply_move(self, move: str) -> None:
+        """
+        Apply move to this state in place. It can be reverted by undo_move.
+        >>> stone = StonehengeState(True, 2)
+        >>> stone.apply_move('A')
+        >>> stone.cells
+        ['1', 'B', 'C', 'D', 'E', 'F', 'G']
+        >>> stone.ley_lines
+        ['1', '@', '@', '@', '@', '@', '@', '@', '1']
+        >>> stone.p1_turn
+        False
+        """
+        indices, positions = get_cell_layout(self.side_length)[:2]
+        lines = positions[move]
+        before = None
+        if self._finishing is not None:
+            before = self._finishing_lines(lines)
+            for player in (1, 2):
+                self._threat_counts[player][
+                    self._finishing[player][indices[move]]] -= 1
+        captured = []
+        for pos in lines:
+            ley_line = self.ley_lines[pos]
+            self.change_claim(pos, self.claims, self.ley_lines, self.captured)
+            if self.ley_lines[pos] != ley_line:
+                captured.append(pos)
+        self.cells[indices[move]] = '1' if self.p1_turn else '2'
+        if before is not None:
+            self._update_threats(lines, before)
+        self._history.append((move, captured))
+        self.p1_turn = not self.p1_turn
+        self._key = None
+
+    def undo_move(self) -> None:
+        """
+        Revert the last move applied by apply_move.
+        >>> stone = StonehengeState(True, 2)
+        >>> stone.apply_move('A')
+        >>> stone.undo_move()
+        >>> repr(stone) == repr(StonehengeState(True, 2))
+        True
+        >>> stone.claims == StonehengeState(True, 2).claims
+        True
+        """
+        move, captured = self._history.pop()
+        self.p1_turn = not self.p1_turn
+        indices, positions = get_cell_layout(self.side_length)[:2]
+        lines = positions[move]
+        before = None
+        if self._finishing is not None:
+            before = self._finishing_lines(lines)
+        player = 1 if self.p1_turn else 2
+        for pos in lines:
+            self.claims[pos][player] -= 1
+        for pos in captured:
+            self.ley_lines[pos] = '@'
+        self.captured[player] -= len(captured)
+        if before is not None:
+            self._update_threats(lines, before)
+            finishing = self._finishing_lines(lines)
+            for player in (1, 2):
+                count = sum([finishes[player] for finishes in finishing])
+                self._finishing[player][indices[move]] = count
+                self._threat_counts[player][count] += 1
+        self.cells[indices[move]] = move
+        self._key = None
+
     def __repr__(self) -> str:
         """
         Return a representation of this state (which can be used for
@@ -104,6 +301,240 @@ class StonehengeState(GameState):
                                                           self.side_length) \
                + self.__str__()
 
+    def state_key(self) -> Tuple:
+        """
+        Return a compact hashable key identifying this state.
+        The ley lines are part of the key since a ley line belongs to whoever
+        captured it first. The key is computed once until the state is
+        changed by apply_move or undo_move.
+        >>> stone = StonehengeState(True, 1)
+        >>> stone.state_key()
+        (True, 'ABC', '@@@@@@')
+        >>> stone.make_move('B').state_key()
+        (False, 'A1C', '1@@11@')
+        >>> stone.make_move('B') == stone.make_move('B')
+        True
+        >>> len({stone, stone.make_move('B'), StonehengeState(True, 1)})
+        2
+        """
+        if self._key is None:
+            self._key = (self.p1_turn, ''.join(self.cells),
+                         ''.join(self.ley_lines))
+        return self._key
+
+    def canonicalize(self) -> Tuple[Tuple, Dict[str, str]]:
+        """
+        Return the state_key of the representative of this state among all
+        its rotations and reflections, and a dictionary mapping each move
+        of the representative to the corresponding move of this state.
+        >>> stone = StonehengeState(True, 2)
+        >>> key, move_map = stone.make_move('A').canonicalize()
+        >>> key == stone.make_move('B').canonicalize()[0]
+        True
+        >>> key
+        (False, '1BCDEFG', '1@@@@@@@1')
+        >>> move_map['B']
+        'B'
+        """
+        best = None
+        for cell_perm, line_perm in get_symmetries(self.side_length):
+            cells = [''] * len(self.cells)
+            for i in range(len(cells)):
+                cells[cell_perm[i]] = self.cells[i] \
+                    if not self.cells[i].isalpha() else self.CELL[cell_perm[i]]
+            ley_lines = [''] * len(self.ley_lines)
+            for j in range(len(ley_lines)):
+                ley_lines[line_perm[j]] = self.ley_lines[j]
+            key = (self.p1_turn, ''.join(cells), ''.join(ley_lines))
+            if best is None or key < best[0]:
+                best = (key, cell_perm)
+        move_map = {}
+        for i in range(len(self.cells)):
+            if self.cells[i].isalpha():
+                move_map[self.CELL[best[1][i]]] = self.cells[i]
+        return best[0], move_map
+
+    def canonical_key(self) -> Tuple:
+        """
+        Return a key shared by this state and all its rotations and
+        reflections.
+        """
+        return self.canonicalize()[0]
+
+    def get_distinct_moves(self) -> list:
+        """
+        Return the possible moves of this state, leaving out every move whose
+        result is a rotation or reflection of the result of an earlier move.
+        >>> StonehengeState(True, 2).get_distinct_moves()
+        ['A', 'D']
+        """
+        moves = []
+        seen = set()
+        for move in self.get_possible_moves():
+            self.apply_move(move)
+            key = self.canonical_key()
+            self.undo_move()
+            if key not in seen:
+                seen.add(key)
+                moves.append(move)
+        return moves
+
+    def get_move_priorities(self, moves: list) -> list:
+        """
+        Return 2 for each move in moves which captures enough ley lines to
+        win, 1 for each move on a ley line the other player has claimed cells
+        of and would capture by claiming this cell, and 0 for every other
+        move.
+        >>> StonehengeState(True, 1).get_move_priorities(['A', 'B', 'C'])
+        [2, 2, 2]
+        >>> stone = StonehengeState(True, 2).make_move('A')
+        >>> stone.get_move_priorities(['B', 'C', 'D'])
+        [0, 0, 1]
+        """
+        positions, capacities = get_cell_layout(self.side_length)[1:]
+        own, opponent = (1, 2) if self.p1_turn else (2, 1)
+        # captures still needed to hold at least half of the ley lines
+        needed = (len(self.ley_lines) + 1) // 2 - self.captured[own]
+        priorities = []
+        for move in moves:
+            captures = 0
+            blocks = False
+            for line in positions[move]:
+                if self.ley_lines[line] != '@':
+                    continue
+                claims = self.claims[line]
+                if 2 * (claims[own] + 1) >= capacities[line]:
+                    captures += 1
+                if claims[opponent] > 0 and \
+                        2 * (claims[opponent] + 1) >= capacities[line]:
+                    blocks = True
+            priorities.append(2 if captures >= needed else int(blocks))
+        return priorities
+
+    def _finishes(self, line: int, player: int) -> bool:
+        """
+        Return whether player (1 or 2) would capture ley line line by
+        claiming one more of its cells.
+        """
+        claims = self.claims[line]
+        return self.ley_lines[line] == '@' and 2 * (claims[player] + 1) >= \
+            claims[0]
+
+    def _finishing_lines(self, lines: Tuple) -> List[Tuple]:
+        """
+        Return (None, whether p1 finishes it, whether p2 finishes it) for
+        each ley line in lines, indexed by player like claims.
+        """
+        return [(None, self._finishes(line, 1), self._finishes(line, 2))
+                for line in lines]
+
+    def _count_threats(self) -> None:
+        """
+        Count, for each player (1 or 2):
+        - in _near_captured[player], the ley lines the player would capture
+          by claiming one more cell
+        - in _finishing[player][i], how many of them the unclaimed cell i
+          finishes
+        - in _threat_counts[player][k], how many unclaimed cells finish k
+          of them
+        """
+        line_cells = get_line_cells(self.side_length)
+        self._finishing = [None, [0] * len(self.cells), [0] * len(self.cells)]
+        self._threat_counts = [None, [0] * 4, [0] * 4]
+        self._near_captured = [None, 0, 0]
+        for line in range(len(self.ley_lines)):
+            for player in (1, 2):
+                if self._finishes(line, player):
+                    self._near_captured[player] += 1
+                    for i in line_cells[line]:
+                        if self.cells[i].isalpha():
+                            self._finishing[player][i] += 1
+        for i in range(len(self.cells)):
+            if self.cells[i].isalpha():
+                for player in (1, 2):
+                    self._threat_counts[player][self._finishing[player][i]] \
+                        += 1
+
+    def _update_threats(self, lines: Tuple, before: List[Tuple]) -> None:
+        """
+        Update the threat counters for the ley lines in lines, whose
+        _finishing_lines were before, after a cell of them changed hands.
+        The changed cell must be claimed while this runs.
+        """
+        line_cells = get_line_cells(self.side_length)
+        for line, finished in zip(lines, before):
+            for player in (1, 2):
+                change = self._finishes(line, player) - finished[player]
+                if change == 0:
+                    continue
+                self._near_captured[player] += change
+                finishing = self._finishing[player]
+                counts = self._threat_counts[player]
+                for i in line_cells[line]:
+                    if self.cells[i].isalpha():
+                        counts[finishing[i]] -= 1
+                        finishing[i] += change
+                        counts[finishing[i]] += 1
+
+    def _needed(self, player: int) -> int:
+        """
+        Return how many more ley lines player (1 or 2) has to capture to
+        hold at least half of them.
+        """
+        return (len(self.ley_lines) + 1) // 2 - self.captured[player]
+
+    def get_threats(self, player: str) -> Tuple[int, List[str]]:
+        """
+        Return the number of ley lines player would capture by claiming one
+        more cell, and the cells which finish at least one of them.
+        >>> stone = StonehengeState(True, 2).make_move('B')
+        >>> stone.get_threats('p1')
+        (5, ['A', 'C', 'D', 'E', 'F', 'G'])
+        >>> stone.get_threats('p2')
+        (4, ['A', 'C', 'E', 'F', 'G'])
+        """
+        if self._finishing is None:
+            self._count_threats()
+        number = 1 if player == 'p1' else 2
+        return (self._near_captured[number],
+                [self.cells[i] for i in range(len(self.cells))
+                 if self.cells[i].isalpha() and self._finishing[number][i]])
+
+    def _must_lose(self) -> bool:
+        """
+        Return whether every move of the current player, none of which wins
+        at once, leaves the other player a move that wins at once.
+        Precondition: the threat counters are counted
+        """
+        positions, capacities = get_cell_layout(self.side_length)[1:]
+        line_cells = get_line_cells(self.side_length)
+        player, other = (1, 2) if self.p1_turn else (2, 1)
+        needed = self._needed(other)
+        if needed > 3:
+            return False
+        finishing = self._finishing[other]
+        # unclaimed cells with which the other player wins
+        winning = sum(self._threat_counts[other][needed:])
+        for move in self.get_possible_moves():
+            i = self.CELL.index(move)
+            # the move takes a winning cell, and the ley lines it captures
+            # can no longer be finished by the other player
+            lost = 1 if finishing[i] >= needed else 0
+            reduced = {}
+            for line in positions[move]:
+                if self._finishes(line, other) and \
+                        2 * (self.claims[line][player] + 1) >= \
+                        capacities[line]:
+                    for cell in line_cells[line]:
+                        if cell != i and self.cells[cell].isalpha() and \
+                                finishing[cell] >= needed:
+                            reduced[cell] = reduced.get(cell, 0) + 1
+            lost += len([cell for cell in reduced
+                         if finishing[cell] - reduced[cell] < needed])
+            if lost == winning:
+                return False
+        return True
+
     def change_cell(self, move: str) -> List[str]:
         """
         Change the cell according to move.
@@ -114,10 +545,8 @@ class StonehengeState(GameState):
         ['A', '1', 'C', 'D', 'E', 'F', 'G']
         """
         cells = self.cells[:]
-        for i in range(len(cells)):
-            if cells[i] == move:
-                cells[i] = '1' if self.get_current_player_name() == 'p1' \
-                    else '2'
+        cells[get_cell_layout(self.side_length)[0][move]] = \
+            '1' if self.get_current_player_name() == 'p1' else '2'
         return cells
 
     def get_position(self, move: str) -> Tuple:
@@ -130,22 +559,13 @@ class StonehengeState(GameState):
         >>> stone.get_position('K')
         (3, 9, 5)
         """
-        index = self.cells.index(move)
-        row = 0
-        i = 2
-        while index - i >= 0 and i <= self.side_length + 1:
-            index = index - i
-            i += 1
-            row += 1
-        if row == self.side_length:
-            index += 1
-        down_left = (self.side_length + 1) * 3 - index - 1
-        down_right = (self.side_length + 1) * 2 - 1 - (row + 1 - index)
-        return (row, down_left, down_right)
-
-    def change_claims(self, move: str) -> (Dict, List):
-        """
-        Change claims according to move.
+        return get_cell_layout(self.side_length)[1][move]
+
+    def change_claims(self, move: str, captured: List = None) \
+            -> (Dict, List):
+        """
+        Change claims according to move, counting the ley lines it captures
+        in captured if given.
         >>> stone = StonehengeState(True, 2)
         >>> stone.change_claims('A')
         ({0: [2, 1, 0], 3: [2, 0, 0], 6: [2, 0, 0], 1: [3, 0, 0], 4: [3, 1, 0], 7: [3, 0, 0], 2: [2, 0, 0], 5: [2, 0, 0], 8: [2, 1, 0]}, ['1', '@', '@', '@', '@', '@', '@', '@', '1'])
@@ -157,24 +577,29 @@ class StonehengeState(GameState):
             claim[c] = self.claims[c][:]
         ley_line = self.ley_lines[:]
         for pos in self.get_position(move):
-            self.change_claim(pos, claim, ley_line)
+            self.change_claim(pos, claim, ley_line, captured)
         return claim, ley_line
 
-    def change_claim(self, position: int, claims: Dict, ley_lines: List) \
-            -> None:
+    def change_claim(self, position: int, claims: Dict, ley_lines: List,
+                     captured: List = None) -> None:
         """
-        Change claim according to the No. of ley line
+        Change claim according to the No. of ley line, counting the ley line
+        in captured if given and the current player captures it.
         """
-        if self.get_current_player_name() == 'p1':
+        if self.p1_turn:
             claims[position][1] += 1
             if ley_lines[position] == '@' and \
                     2 * claims[position][1] >= claims[position][0]:
                 ley_lines[position] = '1'
-        elif self.get_current_player_name() == 'p2':
+                if captured is not None:
+                    captured[1] += 1
+        else:
             claims[position][2] += 1
             if ley_lines[position] == '@' and \
                     2 * claims[position][2] >= claims[position][0]:
                 ley_lines[position] = '2'
+                if captured is not None:
+                    captured[2] += 1
 
     def count(self, player: str) -> int:
         """
@@ -189,8 +614,8 @@ class StonehengeState(GameState):
         1
         """
         if player == 'p1':
-            return sum([1 if ley == '1' else 0 for ley in self.ley_lines])
-        return sum([1 if ley == '2' else 0 for ley in self.ley_lines])
+            return self.captured[1]
+        return self.captured[2]
 
     def state_over(self)-> bool:
         """
@@ -200,8 +625,8 @@ class StonehengeState(GameState):
         >>> new_state.state_over()
         True
         """
-        total = (self.side_length + 1) * 3
-        return 2 * self.count('p1') >= total or 2 * self.count('p2') >= total
+        total = len(self.ley_lines)
+        return 2 * max(self.captured[1], self.captured[2]) >= total
 
     def rough_outcome(self) -> float:
         """
@@ -238,19 +663,14 @@ class StonehengeState(GameState):
         else:
             if self.win_in_one() == 1:
                 return self.WIN
-            else:
-                new_states = []
-                for move in self.get_possible_moves():
-                    new_states.append(self.make_move(move))
-                if all([new_state.win_in_one() == 1
-                        for new_state in new_states]):
-                    return self.LOSE
+            elif self._must_lose():
+                return self.LOSE
         return self.DRAW
 
     def win_in_one(self) -> int:
         """
         Return whether the current player of a state that is not over
-        can win immediately.
+        can win immediately, looked up in the threat counters.
         >>> stone = StonehengeState(True, 1)
         >>> stone.win_in_one()
         1
@@ -261,11 +681,13 @@ class StonehengeState(GameState):
         >>> stone.win_in_one()
         0
         """
-        if not self.state_over():
-            for move in self.get_possible_moves():
-                new_state = self.make_move(move)
-                if new_state.state_over():
-                    return 1
+        if self.state_over():
+            return 0
+        if self._finishing is None:
+            self._count_threats()
+        player = 1 if self.p1_turn else 2
+        if any(self._threat_counts[player][self._needed(player):]):
+            return 1
         return 0
 
 
@@ -5,8 +5,14 @@ NOTE: Make sure this file adheres to python-ta.
 Adjust the type annotations as needed, and implement both a recursive
 and an iterative version of minimax.
 """
-from typing import Any
-from state_tree import StateTree
+import time
+from typing import Any, Dict, Union
+from transposition_table import TranspositionTable, \
+    BoundedTranspositionTable, DEFAULT_MB, EXACT, LOWER, UPPER
+import instrumentation
+import move_ordering
+from search_session import session_for
+from move_ordering import MoveOrderer
 
 # TODO: Adjust the type annotation as needed.
 
@@ -63,13 +69,16 @@ def rough_outcome_strategy(game: Any) -> Any:
 def minimax_recursive_strategy(game: Any) -> Any:
     """
     Obtain a move using recursion
+    Scores solved on earlier turns of game are reused from its session.
     """
     current_state = game.current_state
-    possible_moves = current_state.get_possible_moves()
+    possible_moves = current_state.get_distinct_moves()
+    table = session_for(game).table
+    orderer = move_ordering.new_orderer()
     tie_move = []
     for move in possible_moves:
         new_state = current_state.make_move(move)
-        score = recursive_score(game, new_state)
+        score = recursive_score(game, new_state, table, 1, orderer)
         if score == 1:
             return move
         elif score == 0:
@@ -79,17 +88,60 @@ def minimax_recursive_strategy(game: Any) -> Any:
     return possible_moves[0]
 
 
-def recursive_score(game: Any, state: Any) -> int:
+def ordered_moves(state: Any, depth: int,
+                  orderer: Union[MoveOrderer, None]) -> list:
+    """
+    Return the possible moves of state at depth, in the order given by
+    orderer if there is one.
+    """
+    moves = state.get_possible_moves()
+    if orderer is not None:
+        return orderer.order(state, moves, depth)
+    return moves
+
+
+def recursive_score(game: Any, state: Any,
+                    table: Union[TranspositionTable, None] = None,
+                    depth: int = 1,
+                    orderer: Union[MoveOrderer, None] = None) -> int:
     """
     Get the final score for a move.
+    If table is given, scores of states already in table are reused and
+    newly computed scores are stored in it.
+    depth is the number of moves state is below the root of the search.
+    If orderer is given, the moves of each state are tried in its order.
+    Since no move can score better than 1, the rest of the moves of a
+    state are not searched once one of them scores 1.
     """
+    search = instrumentation.recorder
+    if search is not None:
+        search.node(depth)
     if game.is_over(state):
+        if search is not None:
+            search.terminal(depth)
         return score_state_over(game, state)
-    new_states = []
-    for move in state.get_possible_moves():
-        new_states.append(state.make_move(move))
-    return (-1) * max([recursive_score(game, new_state)
-                       for new_state in new_states])
+    if table is not None:
+        key = state.state_key()
+        score = table.get(key)
+        if score is not None:
+            if search is not None:
+                search.cache_hit(depth)
+            return score
+    moves = ordered_moves(state, depth, orderer)
+    best = -1
+    for move in moves:
+        best = max(best, recursive_score(game, state.make_move(move), table,
+                                         depth + 1, orderer))
+        if best == 1:
+            if search is not None:
+                search.cutoff(depth)
+            if orderer is not None:
+                orderer.record(move, depth, len(moves))
+            break
+    score = (-1) * best
+    if table is not None:
+        table.put(key, score)
+    return score
 
 # TODO: Implement an iterative version of the minimax strategy.
 
@@ -97,13 +149,22 @@ def recursive_score(game: Any, state: Any) -> int:
 def minimax_iterative_strategy(game: Any) -> Any:
     """
     Obtain a move using iteration
+    Scores solved on earlier turns of game are reused from its session.
+
+    >>> from stonehenge import StonehengeGame
+    >>> from stonehenge_retrograde import RetrogradeSolution, check_strategy
+    >>> check_strategy(RetrogradeSolution(2), minimax_iterative_strategy,
+    ...                StonehengeGame, 20)
+    []
     """
     current_state = game.current_state
-    possible_moves = current_state.get_possible_moves()
+    possible_moves = current_state.get_distinct_moves()
+    table = session_for(game).table
+    orderer = move_ordering.new_orderer()
     tie_move = []
     for move in possible_moves:
         new_state = current_state.make_move(move)
-        score = iterative_score(game, new_state)
+        score = iterative_score(game, new_state, table, orderer)
         if score == 1:
             return move
         elif score == 0:
@@ -113,31 +174,361 @@ def minimax_iterative_strategy(game: Any) -> Any:
     return possible_moves[0]
 
 
-def iterative_score(game: Any, state: Any) -> int:
+def iterative_score(game: Any, state: Any,
+                    table: Union[TranspositionTable, None] = None,
+                    orderer: Union[MoveOrderer, None] = None) -> int:
     """
     Get the final score for a move.
+    If table is given, scores of states already in table are reused and
+    newly computed scores are stored in it.
+    If orderer is given, the moves of each state are tried in its order.
+    Since no move can score better than 1, the rest of the moves of a
+    state are not searched once one of them scores 1.
+
+    Moves are applied to and undone on state, which is unchanged when this
+    returns. Only the frames of the current path are kept: each frame holds
+    the moves left to try, the best child score so far, the state's key,
+    the move being tried and the number of moves of the state.
     """
-    new_states = []
-    root = StateTree(state)
-    new_states.append(root)
-    while new_states != []:
-        mother = new_states.pop()
-        # state is over
-        if game.is_over(mother.state):
-            mother.score = score_state_over(game, mother.state)
-        # state is not over but have children already
-        elif mother.children is not None:
-            mother.score = (-1) * max([child.score
-                                       for child in mother.children])
-        # don't have children
+    search = instrumentation.recorder
+    if search is not None:
+        search.node(1)
+    if game.is_over(state):
+        if search is not None:
+            search.terminal(1)
+        return score_state_over(game, state)
+    moves = ordered_moves(state, 1, orderer)
+    frames = [[iter(moves), -1, state.state_key(), None, len(moves)]]
+    while True:
+        frame = frames[-1]
+        # no move can score better than 1
+        move = next(frame[0], None) if frame[1] < 1 else None
+        # all children scored
+        if move is None:
+            score = (-1) * frame[1]
+            if table is not None:
+                table.put(frame[2], score)
+            frames.pop()
+            if frames == []:
+                return score
+            state.undo_move()
+            frame = frames[-1]
         else:
-            mother.children = []
-            for move in mother.state.get_possible_moves():
-                mother.children.append(StateTree(mother.state.make_move(move)))
-            new_states.append(mother)
-            for child in mother.children:
-                new_states.append(child)
-    return root.score
+            frame[3] = move
+            state.apply_move(move)
+            if search is not None:
+                search.node(len(frames) + 1)
+            # state is over
+            if game.is_over(state):
+                if search is not None:
+                    search.terminal(len(frames) + 1)
+                score = score_state_over(game, state)
+            # state is already solved
+            elif table is not None and state.state_key() in table:
+                if search is not None:
+                    search.cache_hit(len(frames) + 1)
+                score = table.get(state.state_key())
+            # state is not over: score its children first
+            else:
+                moves = ordered_moves(state, len(frames) + 1, orderer)
+                frames.append([iter(moves), -1, state.state_key(), None,
+                               len(moves)])
+                continue
+            state.undo_move()
+        frame[1] = max(frame[1], score)
+        if score == 1:
+            if search is not None:
+                search.cutoff(len(frames))
+            if orderer is not None:
+                orderer.record(frame[3], len(frames), frame[4])
+
+
+def minimax_inplace_strategy(game: Any) -> Any:
+    """
+    Obtain the same move as minimax_recursive_strategy by applying and
+    undoing moves on a single state instead of creating a state per node.
+    Scores solved on earlier turns of game are reused from its session.
+    """
+    current_state = game.current_state
+    possible_moves = current_state.get_distinct_moves()
+    table = session_for(game).table
+    orderer = move_ordering.new_orderer()
+    tie_move = []
+    for move in possible_moves:
+        new_state = current_state.make_move(move)
+        score = inplace_score(game, new_state, table, 1, orderer)
+        if score == 1:
+            return move
+        elif score == 0:
+            tie_move.append(move)
+    if tie_move != []:
+        return tie_move[0]
+    return possible_moves[0]
+
+
+def inplace_score(game: Any, state: Any,
+                  table: Union[TranspositionTable, None] = None,
+                  depth: int = 1,
+                  orderer: Union[MoveOrderer, None] = None) -> int:
+    """
+    Get the final score for a move, walking the game tree by applying and
+    undoing moves on state. state is unchanged when this returns.
+    depth is the number of moves state is below the root of the search.
+    If orderer is given, the moves of each state are tried in its order.
+    Since no move can score better than 1, the rest of the moves of a
+    state are not searched once one of them scores 1.
+    """
+    search = instrumentation.recorder
+    if search is not None:
+        search.node(depth)
+    if game.is_over(state):
+        if search is not None:
+            search.terminal(depth)
+        return score_state_over(game, state)
+    if table is not None:
+        key = state.state_key()
+        score = table.get(key)
+        if score is not None:
+            if search is not None:
+                search.cache_hit(depth)
+            return score
+    moves = ordered_moves(state, depth, orderer)
+    best = -1
+    for move in moves:
+        state.apply_move(move)
+        best = max(best, inplace_score(game, state, table, depth + 1,
+                                       orderer))
+        state.undo_move()
+        if best == 1:
+            if search is not None:
+                search.cutoff(depth)
+            if orderer is not None:
+                orderer.record(move, depth, len(moves))
+            break
+    if table is not None:
+        table.put(key, (-1) * best)
+    return (-1) * best
+
+
+def alphabeta_strategy(game: Any, memory_mb: float = DEFAULT_MB) -> Any:
+    """
+    Obtain the same move as minimax_recursive_strategy using an alpha-beta
+    pruned negamax search, with a transposition table of memory_mb
+    megabytes. The bounds found on earlier turns of game are reused from
+    its session.
+
+    >>> from stonehenge import StonehengeGame
+    >>> from stonehenge_retrograde import RetrogradeSolution, check_strategy
+    >>> check_strategy(RetrogradeSolution(2), alphabeta_strategy,
+    ...                StonehengeGame, 20)
+    []
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> games = [SubtractSquareGame(True, total) for total in range(1, 41)]
+    >>> [alphabeta_strategy(game) for game in games] == \\
+    ...     [minimax_recursive_strategy(game) for game in games]
+    True
+    """
+    current_state = game.current_state
+    possible_moves = current_state.get_distinct_moves()
+    orderer = move_ordering.new_orderer()
+    table = session_for(game).bounded_table('alphabeta', memory_mb)
+    tie_move = None
+    for move in possible_moves:
+        new_state = current_state.make_move(move)
+        # once a tie is found, only a win can change the chosen move
+        alpha = -1 if tie_move is None else 0
+        score = (-1) * alphabeta_score(game, new_state, -1, -alpha, 1,
+                                       orderer, table)
+        if score == 1:
+            return move
+        elif score == 0 and tie_move is None:
+            tie_move = move
+    if tie_move is not None:
+        return tie_move
+    return possible_moves[0]
+
+
+def alphabeta_score(game: Any, state: Any, alpha: int, beta: int,
+                    depth: int = 1,
+                    orderer: Union[MoveOrderer, None] = None,
+                    table: Union[BoundedTranspositionTable, None] = None) \
+        -> int:
+    """
+    Get the score of state for its current player, searching only as much
+    as needed to tell whether the score is at most alpha, at least beta or
+    exactly some value in between.
+    depth is the number of moves state is below the root of the search.
+    If orderer is given, the moves of each state are tried in its order.
+    If table is given, the scores found are stored in it as bounds, with
+    the number of moves of their state as the depth, and reused when they
+    settle the search of a state.
+    """
+    search = instrumentation.recorder
+    if search is not None:
+        search.node(depth)
+    if game.is_over(state):
+        if search is not None:
+            search.terminal(depth)
+        return (-1) * score_state_over(game, state)
+    if table is not None:
+        key = state.state_key()
+        entry = table.probe(key)
+        if entry is not None and _settles(entry, alpha, beta):
+            if search is not None:
+                search.cache_hit(depth)
+            return entry[0]
+    moves = ordered_moves(state, depth, orderer)
+    best = -1
+    for move in moves:
+        score = (-1) * alphabeta_score(game, state.make_move(move),
+                                       -beta, -max(alpha, best), depth + 1,
+                                       orderer, table)
+        if score > best:
+            best = score
+            if best >= beta:
+                if search is not None:
+                    search.cutoff(depth)
+                if orderer is not None:
+                    orderer.record(move, depth, len(moves))
+                break
+    if table is not None:
+        table.store(key, best, _bound(best, alpha, beta), len(moves))
+    return best
+
+
+def _settles(entry: tuple, alpha: float, beta: float) -> bool:
+    """
+    Return whether the (score, bound, depth) entry of a transposition table
+    gives the result of a search of its state between alpha and beta.
+    """
+    score, bound = entry[0], entry[1]
+    return bound == EXACT or (bound == LOWER and score >= beta) \
+        or (bound == UPPER and score <= alpha)
+
+
+def _bound(score: float, alpha: float, beta: float) -> int:
+    """
+    Return the kind of bound score, found by a search between alpha and
+    beta, is on the true score.
+    """
+    if score <= alpha:
+        return UPPER
+    elif score >= beta:
+        return LOWER
+    return EXACT
+
+
+class SearchTimeout(Exception):
+    """
+    Raised when a search runs past its deadline.
+    """
+
+
+def iterative_deepening_strategy(game: Any, time_limit: float = 1.0,
+                                 memory_mb: float = DEFAULT_MB) -> Any:
+    """
+    Obtain a move by searching to depth 1, 2, 3, ... until time_limit
+    seconds have passed, using rough_outcome() to score states at the depth
+    limit, and return the best move of the deepest completed search.
+    The searches share a transposition table of memory_mb megabytes.
+    The best move found for each state at one depth is tried first at the
+    next depth, and root moves are tried in order of their last score.
+    The best moves and the table are kept in the session of game, so the
+    next turn tries those moves first too and reuses the scores found.
+
+    >>> from stonehenge import StonehengeGame
+    >>> game = StonehengeGame(True, 2)
+    >>> for move in ['D', 'A', 'B']:
+    ...     game.current_state = game.current_state.make_move(move)
+    >>> iterative_deepening_strategy(game, 0.1)
+    'G'
+    """
+    deadline = time.perf_counter() + time_limit
+    current_state = game.current_state
+    possible_moves = current_state.get_distinct_moves()
+    session = session_for(game)
+    best_moves = session.best_moves
+    table = session.bounded_table('iterative deepening', memory_mb)
+    best_move = possible_moves[0]
+    depth = 1
+    # depth 1 always completes, so there is a move to return
+    limit = None
+    while depth <= len(current_state.get_possible_moves()):
+        scores = {}
+        try:
+            for move in possible_moves:
+                new_state = current_state.make_move(move)
+                scores[move] = (-1) * limited_score(game, new_state,
+                                                    depth - 1, -1, 1,
+                                                    limit, best_moves, 1,
+                                                    table)
+        except SearchTimeout:
+            break
+        # sort is stable, so ties keep the order of the last depth
+        possible_moves.sort(key=lambda m: -scores[m])
+        best_move = possible_moves[0]
+        if scores[best_move] == 1:
+            break
+        limit = deadline
+        depth += 1
+    return best_move
+
+
+def limited_score(game: Any, state: Any, depth: int, alpha: float,
+                  beta: float, deadline: Union[float, None],
+                  best_moves: Dict, ply: int = 1,
+                  table: Union[BoundedTranspositionTable, None] = None) \
+        -> float:
+    """
+    Get the score of state for its current player from an alpha-beta
+    search depth moves deep, scoring states at the depth limit with
+    rough_outcome(). The best move of each searched state is recorded in
+    best_moves and tried first next time.
+    ply is the number of moves state is below the root of the search.
+    If table is given, the scores found are stored in it as bounds, and
+    reused for searches at most as deep when they settle them.
+    Raise SearchTimeout once time.perf_counter() passes deadline.
+    """
+    if deadline is not None and time.perf_counter() > deadline:
+        raise SearchTimeout
+    search = instrumentation.recorder
+    if search is not None:
+        search.node(ply)
+    if game.is_over(state):
+        if search is not None:
+            search.terminal(ply)
+        return (-1) * score_state_over(game, state)
+    if depth == 0:
+        return state.rough_outcome()
+    key = state.state_key()
+    if table is not None:
+        entry = table.probe(key)
+        if entry is not None and entry[2] >= depth \
+                and _settles(entry, alpha, beta):
+            if search is not None:
+                search.cache_hit(ply)
+            return entry[0]
+    moves = state.get_possible_moves()
+    if best_moves.get(key) in moves:
+        moves.remove(best_moves[key])
+        moves.insert(0, best_moves[key])
+    best = -2
+    for move in moves:
+        state.apply_move(move)
+        score = (-1) * limited_score(game, state, depth - 1, -beta,
+                                     -max(alpha, best), deadline, best_moves,
+                                     ply + 1, table)
+        state.undo_move()
+        if score > best:
+            best = score
+            best_moves[key] = move
+            if best >= beta:
+                if search is not None:
+                    search.cutoff(ply)
+                break
+    if table is not None:
+        table.store(key, best, _bound(best, alpha, beta), depth)
+    return best
 
 
 def score_state_over(game: Any, state: Any) -> int:
@@ -0,0 +1,131 @@
+"""
+A bottom-up solver for Subtract Square.
+"""
+import threading
+from typing import Any, Union
+import numpy as np
+from subtract_square_state import SubtractSquareState
+from strategy import alphabeta_strategy
+
+
+class SubtractSquareSolver:
+    """
+    A table of whether the current player can win Subtract Square from each
+    total up to limit, stored as one bit per total.
+
+    limit: the largest total in the table
+    """
+    limit: int
+    _bits: np.ndarray
+    _squares: np.ndarray
+
+    def __init__(self, limit: int) -> None:
+        """
+        Solve every total from 0 to limit.
+
+        Every move from a losing total leads to a winning total, and a total
+        none of whose moves leads to a losing total is losing. So going up
+        from 0, the first total not yet marked winning is losing, and all
+        totals a square above it are marked winning at once.
+
+        >>> solver = SubtractSquareSolver(10)
+        >>> [n for n in range(11) if not solver.is_winning(n)]
+        [0, 2, 5, 7, 10]
+        """
+        self.limit = limit
+        squares = np.arange(1, int(limit ** 0.5) + 2, dtype=np.int64) ** 2
+        squares = squares[squares <= limit]
+        winning = np.zeros(limit + 1, dtype=bool)
+        losing = 0
+        while losing <= limit:
+            targets = losing + squares
+            winning[targets[targets <= limit]] = True
+            losing = self._next_losing(winning, losing + 1)
+        self._bits = np.packbits(winning, bitorder='little')
+        self._squares = squares
+
+    @staticmethod
+    def _next_losing(winning: np.ndarray, start: int) -> int:
+        """
+        Return the first total from start on which is not marked winning,
+        or len(winning) if there is none.
+        """
+        step = 64
+        while start < len(winning):
+            window = winning[start:start + step]
+            if not window.all():
+                return start + int(np.argmin(window))
+            start += step
+            step *= 2
+        return len(winning)
+
+    def is_winning(self, total: int) -> bool:
+        """
+        Return whether the current player can win from total.
+        Precondition: 0 <= total <= self.limit
+
+        >>> solver = SubtractSquareSolver(100)
+        >>> solver.is_winning(4), solver.is_winning(5)
+        (True, False)
+        """
+        return bool(self._bits[total >> 3] >> (total & 7) & 1)
+
+    def winning_move(self, total: int) -> Union[int, None]:
+        """
+        Return the smallest square whose subtraction from total wins, or None
+        if total is losing.
+        Precondition: 0 <= total <= self.limit
+
+        >>> solver = SubtractSquareSolver(100)
+        >>> solver.winning_move(28), solver.winning_move(20)
+        (16, None)
+        """
+        if not self.is_winning(total):
+            return None
+        squares = self._squares[:int(total ** 0.5) + 1]
+        targets = total - squares[squares <= total]
+        winning = self._bits[targets >> 3] >> (targets & 7) & 1
+        return int(squares[np.argmin(winning)])
+
+
+# the solver shared by every call of subtract_square_strategy, replaced by
+# a larger one with _solver_lock held
+_solver = None
+_solver_lock = threading.Lock()
+
+
+def subtract_square_strategy(game: Any) -> Any:
+    """
+    Obtain the same move as minimax_recursive_strategy for Subtract Square
+    by looking it up in a solved table, which is extended whenever a larger
+    total comes up.
+    Any other game falls back to alphabeta_strategy.
+
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> subtract_square_strategy(SubtractSquareGame(True, 20))
+    1
+    >>> from stonehenge import StonehengeGame
+    >>> subtract_square_strategy(StonehengeGame(True, 2))
+    'A'
+    """
+    global _solver
+    current_state = game.current_state
+    if not isinstance(current_state, SubtractSquareState):
+        return alphabeta_strategy(game)
+    total = current_state.current_total
+    with _solver_lock:
+        if _solver is None:
+            _solver = SubtractSquareSolver(max(total, 1000))
+        elif total > _solver.limit:
+            _solver = SubtractSquareSolver(max(total, 2 * _solver.limit))
+        solver = _solver
+    move = solver.winning_move(total)
+    # every move loses, so take the smallest one like minimax does
+    if move is None:
+        return 1
+    return move
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -19,6 +19,8 @@ class SubtractSquareState(GameState):
         """
         super().__init__(is_p1_turn)
         self.current_total = current_total
+        self._history = []
+        self._key = None
 
     def __str__(self) -> str:
         """
@@ -48,6 +50,26 @@ class SubtractSquareState(GameState):
                                         self.current_total - move)
         return new_state
 
+    def apply_move(self, move: Any) -> None:
+        """
+        Apply move to this state in place. It can be reverted by undo_move.
+        """
+        if type(move) == str:
+            move = int(move)
+
+        self.current_total -= move
+        self._history.append(move)
+        self.p1_turn = not self.p1_turn
+        self._key = None
+
+    def undo_move(self) -> None:
+        """
+        Revert the last move applied by apply_move.
+        """
+        self.current_total += self._history.pop()
+        self.p1_turn = not self.p1_turn
+        self._key = None
+
     def __repr__(self) -> str:
         """
         Return a representation of this state (which can be used for
@@ -56,6 +78,31 @@ class SubtractSquareState(GameState):
         return "P1's Turn: {} - Total: {}".format(self.p1_turn,
                                                   self.current_total)
 
+    def state_key(self) -> tuple:
+        """
+        Return a compact hashable key identifying this state. It is computed
+        once until the state is changed by apply_move or undo_move.
+        >>> state = SubtractSquareState(True, 20)
+        >>> state.state_key()
+        (True, 20)
+        >>> state == SubtractSquareState(False, 24).make_move(4)
+        True
+        >>> len({state, SubtractSquareState(True, 20)})
+        1
+        """
+        if self._key is None:
+            self._key = (self.p1_turn, self.current_total)
+        return self._key
+
+    def get_move_priorities(self, moves: list) -> list:
+        """
+        Return 2 for the move which takes the total to 0 and wins, and 0 for
+        every other move in moves.
+        >>> SubtractSquareState(True, 4).get_move_priorities([1, 4])
+        [0, 2]
+        """
+        return [2 if move == self.current_total else 0 for move in moves]
+
     def rough_outcome(self) -> float:
         """
         Return an estimate in interval [LOSE, WIN] of best outcome the current
@@ -0,0 +1,252 @@
+"""
+A headless tournament between strategies, played in a pool of processes.
+
+Every strategy plays every other one the same number of games as Player 1
+and as Player 2, from the same seeded random openings, without any input or
+output. The win, draw and loss rates of each strategy and the percentiles
+of the time it took per move are gathered into one report.
+
+Run it with:
+    python tournament.py --game h --size 3 --strategies ab mc ro --games 50
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple, Union
+from game_interface import playable_games, usable_strategies
+
+# a strategy is given by its key in usable_strategies, or by its key and
+# the keyword arguments to call it with
+StrategySpec = Union[str, Tuple[str, Dict[str, Any]]]
+
+
+def spec_name(spec: StrategySpec) -> str:
+    """
+    Return the name of the strategy given by spec in the report.
+
+    >>> spec_name('ab')
+    'ab'
+    >>> spec_name(('mc', {'playouts': 200}))
+    'mc(playouts=200)'
+    """
+    if isinstance(spec, str):
+        return spec
+    key, kwargs = spec
+    return "{}({})".format(key, ', '.join(
+        "{}={}".format(name, kwargs[name]) for name in sorted(kwargs)))
+
+
+def play_game(game_key: str, parameter: int, p1_spec: StrategySpec,
+              p2_spec: StrategySpec, opening: int, seed: int) \
+        -> Dict[str, Any]:
+    """
+    Play a game of playable_games[game_key] of size parameter, Player 1
+    first, with the strategies given by p1_spec and p2_spec after opening
+    random moves chosen with seed. Return the winner ('p1', 'p2' or None for
+    a draw) and the seconds each player took for each of its moves.
+
+    >>> play_game('h', 1, 'ab', 'ro', 0, 0)['winner']
+    'p1'
+    """
+    game = playable_games[game_key](True, parameter)
+    rng = random.Random(seed)
+    for _ in range(opening):
+        if game.is_over(game.current_state):
+            break
+        move = rng.choice(game.current_state.get_possible_moves())
+        game.current_state = game.current_state.make_move(move)
+    strategies = {}
+    for player, spec in (('p1', p1_spec), ('p2', p2_spec)):
+        key, kwargs = (spec, {}) if isinstance(spec, str) else spec
+        strategies[player] = (usable_strategies[key], kwargs)
+    latencies = {'p1': [], 'p2': []}
+    while not game.is_over(game.current_state):
+        player = game.current_state.get_current_player_name()
+        strategy, kwargs = strategies[player]
+        start = time.perf_counter()
+        move = strategy(game, **kwargs)
+        latencies[player].append(time.perf_counter() - start)
+        game.current_state = game.current_state.make_move(move)
+    winner = None
+    if game.is_winner('p1'):
+        winner = 'p1'
+    elif game.is_winner('p2'):
+        winner = 'p2'
+    return {'winner': winner, 'latencies': latencies}
+
+
+def _play_task(task: Tuple) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Play the game of task in a worker process and return the names of its
+    players with its result.
+    """
+    game_key, parameter, p1_spec, p2_spec, opening, seed = task
+    return (spec_name(p1_spec), spec_name(p2_spec),
+            play_game(game_key, parameter, p1_spec, p2_spec, opening, seed))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Return the nearest-rank percentile fraction of values, or 0.0 if there
+    are no values.
+
+    >>> percentile([4, 1, 3, 2], 0.5)
+    2
+    >>> percentile([4, 1, 3, 2], 0.99)
+    4
+    """
+    if values == []:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(max(1, math.ceil(fraction * len(ordered))), len(ordered))
+    return ordered[rank - 1]
+
+
+def run_tournament(game_key: str, parameter: int,
+                   specs: List[StrategySpec], games: int, opening: int = 2,
+                   workers: Union[int, None] = None, seed: int = 0) \
+        -> Dict[str, Any]:
+    """
+    Play games games between each pair of strategies in specs, with each
+    strategy as Player 1, in a pool of workers processes (one per CPU by
+    default). Both games of a pair with the same number start from the
+    same opening. Return the report of the tournament.
+    """
+    tasks = []
+    for i, first in enumerate(specs):
+        for second in specs[i + 1:]:
+            for number in range(games):
+                for p1_spec, p2_spec in ((first, second), (second, first)):
+                    tasks.append((game_key, parameter, p1_spec, p2_spec,
+                                  opening, seed + number))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as executor:
+        # a few chunks per worker keeps the workers busy to the end
+        chunksize = max(1, len(tasks) // (4 * workers))
+        results = list(executor.map(_play_task, tasks, chunksize=chunksize))
+    seconds = time.perf_counter() - start
+    return make_report(results, seconds)
+
+
+def make_report(results: List[Tuple[str, str, Dict[str, Any]]],
+                seconds: float) -> Dict[str, Any]:
+    """
+    Return the win, draw and loss counts and rates and the move latency
+    percentiles of each strategy in results, and the score of each pair.
+
+    >>> result = {'winner': 'p1', 'latencies': {'p1': [0.5], 'p2': [0.25]}}
+    >>> report = make_report([('ab', 'ro', result)], 1.0)
+    >>> stats = report['strategies']
+    >>> stats['ab']['wins'], stats['ro']['losses']
+    (1, 1)
+    >>> report['pairs']
+    {'ab vs ro': {'ab': 1, 'ro': 0, 'draws': 0}}
+    """
+    strategies = {}
+    latencies = {}
+    pairs = {}
+    for p1_name, p2_name, result in results:
+        for name in (p1_name, p2_name):
+            if name not in strategies:
+                strategies[name] = {'games': 0, 'wins': 0, 'draws': 0,
+                                    'losses': 0}
+                latencies[name] = []
+        pair = ' vs '.join(sorted((p1_name, p2_name)))
+        if pair not in pairs:
+            pairs[pair] = {p1_name: 0, p2_name: 0, 'draws': 0}
+        for player, name in (('p1', p1_name), ('p2', p2_name)):
+            strategies[name]['games'] += 1
+            latencies[name].extend(result['latencies'][player])
+            if result['winner'] is None:
+                strategies[name]['draws'] += 1
+            elif result['winner'] == player:
+                strategies[name]['wins'] += 1
+                pairs[pair][name] += 1
+            else:
+                strategies[name]['losses'] += 1
+        if result['winner'] is None:
+            pairs[pair]['draws'] += 1
+    for name, stats in strategies.items():
+        stats['win_rate'] = stats['wins'] / stats['games']
+        stats['draw_rate'] = stats['draws'] / stats['games']
+        stats['loss_rate'] = stats['losses'] / stats['games']
+        stats['moves'] = len(latencies[name])
+        for label, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+            stats[label] = percentile(latencies[name], fraction)
+        stats['max'] = max(latencies[name], default=0.0)
+    return {'games': len(results), 'seconds': seconds,
+            'strategies': strategies, 'pairs': pairs}
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """
+    Return report as a table of text.
+    """
+    lines = ["{} games in {:.1f}s".format(report['games'], report['seconds']),
+             "{:20} {:>6} {:>6} {:>6} {:>6} {:>9} {:>9} {:>9} {:>9}".format(
+                 'strategy', 'games', 'win', 'draw', 'loss', 'p50 ms',
+                 'p90 ms', 'p99 ms', 'max ms')]
+    ranked = sorted(report['strategies'].items(),
+                    key=lambda item: -item[1]['win_rate'])
+    for name, stats in ranked:
+        lines.append("{:20} {:6} {:6.1%} {:6.1%} {:6.1%} {:9.2f} {:9.2f} "
+                     "{:9.2f} {:9.2f}".format(
+                         name, stats['games'], stats['win_rate'],
+                         stats['draw_rate'], stats['loss_rate'],
+                         stats['p50'] * 1000, stats['p90'] * 1000,
+                         stats['p99'] * 1000, stats['max'] * 1000))
+    for pair, score in sorted(report['pairs'].items()):
+        lines.append("{}: {}".format(pair, ', '.join(
+            "{} {}".format(name, score[name]) for name in score)))
+    return '\n'.join(lines)
+
+
+def main(argv: List[str]) -> int:
+    """
+    Run a tournament from the command line arguments argv.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--game', choices=sorted(playable_games),
+                        default='h')
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--strategies', nargs='+', default=['ab', 'mc', 'ro'],
+                        help='keys of usable_strategies, or key:name=value '
+                             'to pass an integer or float argument')
+    parser.add_argument('--games', type=int, default=20,
+                        help='games per pair of strategies and first player')
+    parser.add_argument('--opening', type=int, default=2,
+                        help='random moves played before the strategies')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write the report to as '
+                                         'JSON')
+    args = parser.parse_args(argv)
+    specs = []
+    for text in args.strategies:
+        if ':' not in text:
+            specs.append(text)
+            continue
+        key, arguments = text.split(':', 1)
+        kwargs = {}
+        for argument in arguments.split(','):
+            name, value = argument.split('=')
+            kwargs[name] = float(value) if '.' in value else int(value)
+        specs.append((key, kwargs))
+    report = run_tournament(args.game, args.size, specs, args.games,
+                            args.opening, args.workers, args.seed)
+    print(format_report(report))
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,343 @@
+"""
+TranspositionTable and BoundedTranspositionTable Classes
+"""
+from array import array
+from typing import Any, Dict, Hashable, Tuple, Union
+
+# the kind of bound a stored score is on the true score of its state
+EXACT = 1
+LOWER = 2
+UPPER = 3
+# replacement policies of a BoundedTranspositionTable
+POLICIES = ('depth', 'always', 'two-tier')
+# bytes per entry of a BoundedTranspositionTable: an 8-byte hash and a
+# 4-byte packed score, bound and depth
+ENTRY_BYTES = 12
+# the memory budget of the tables of the strategies, in megabytes
+DEFAULT_MB = 8
+
+
+class TranspositionTable:
+    """
+    A table of solved scores of game states, so that a state reached by
+    different orders of moves is only searched once.
+
+    hits: number of successful lookups
+    misses: number of failed lookups
+    """
+    hits: int
+    misses: int
+    _scores: Dict[Hashable, int]
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty TranspositionTable.
+
+        >>> table = TranspositionTable()
+        >>> len(table)
+        0
+        >>> table.hits, table.misses
+        (0, 0)
+        """
+        self.hits = 0
+        self.misses = 0
+        self._scores = {}
+
+    def __len__(self) -> int:
+        """
+        Return the number of states stored in this table.
+        """
+        return len(self._scores)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """
+        Return whether a score is stored for key, without counting a lookup.
+
+        >>> table = TranspositionTable()
+        >>> table.put((True, 'AB'), 1)
+        >>> (True, 'AB') in table
+        True
+        >>> table.hits, table.misses
+        (0, 0)
+        """
+        return key in self._scores
+
+    def get(self, key: Hashable) -> Union[int, None]:
+        """
+        Return the score stored for key, or None if key is not stored.
+
+        >>> table = TranspositionTable()
+        >>> table.get((True, 'AB'))
+        >>> table.put((True, 'AB'), 1)
+        >>> table.get((True, 'AB'))
+        1
+        >>> table.hits, table.misses
+        (1, 1)
+        """
+        score = self._scores.get(key)
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return score
+
+    def put(self, key: Hashable, score: int) -> None:
+        """
+        Store score for key.
+        """
+        self._scores[key] = score
+
+    def clear(self) -> None:
+        """
+        Remove all stored scores and reset the counters.
+
+        >>> table = TranspositionTable()
+        >>> table.put((True, 'AB'), 1)
+        >>> table.clear()
+        >>> len(table)
+        0
+        """
+        self.hits = 0
+        self.misses = 0
+        self._scores.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the hit, miss and size counters of this table.
+
+        >>> TranspositionTable().stats()
+        {'hits': 0, 'misses': 0, 'size': 0}
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+
+class BoundedTranspositionTable:
+    """
+    A transposition table of fixed capacity, which never grows past its
+    memory budget, for searches too large to keep every state.
+
+    Entries are kept in two preallocated arrays: the hash of the state_key
+    of each state, and its score, bound and depth packed into one integer
+    (0 for an empty slot). A state's slot is found from its hash, and when
+    the slot holds another state, the replacement policy decides which one
+    is kept:
+        'depth': the new state, if searched at least as deep as the old one
+        'always': the new state
+        'two-tier': slots come in pairs; the first is kept by depth, and
+                    the second always takes the state the first would not
+                    keep, or the one the first gives up
+    Since only hashes are kept, two states with the same 64-bit hash would
+    be taken for each other; this is rare enough to ignore.
+
+    capacity: the number of entries the table holds
+    policy: the replacement policy, one of POLICIES
+    size: the number of slots in use
+    hits: number of successful lookups
+    misses: number of failed lookups
+    stores: number of entries stored
+    collisions: number of stores which found their slots holding other
+                states
+    evictions: number of stores which replaced another state
+    """
+    capacity: int
+    policy: str
+    size: int
+    hits: int
+    misses: int
+    stores: int
+    collisions: int
+    evictions: int
+    _hashes: array
+    _data: array
+
+    def __init__(self, memory_mb: float = DEFAULT_MB,
+                 policy: str = 'two-tier') -> None:
+        """
+        Initialize an empty BoundedTranspositionTable of memory_mb
+        megabytes with the replacement policy policy.
+
+        >>> table = BoundedTranspositionTable(1)
+        >>> table.capacity, len(table)
+        (87380, 0)
+        >>> BoundedTranspositionTable(1, 'random')
+        Traceback (most recent call last):
+        ...
+        ValueError: unknown replacement policy random
+        """
+        if policy not in POLICIES:
+            raise ValueError('unknown replacement policy {}'.format(policy))
+        self.policy = policy
+        self.capacity = max(2, int(memory_mb * (1 << 20)) // ENTRY_BYTES)
+        if policy == 'two-tier':
+            self.capacity -= self.capacity % 2
+        self.clear()
+
+    def __len__(self) -> int:
+        """
+        Return the number of states stored in this table.
+        """
+        return self.size
+
+    def __contains__(self, key: Hashable) -> bool:
+        """
+        Return whether an exact score is stored for key, without counting
+        a lookup.
+
+        >>> table = BoundedTranspositionTable(1)
+        >>> table.put((True, 'AB'), 1)
+        >>> (True, 'AB') in table, (False, 'AB') in table
+        (True, False)
+        """
+        entry = self._find(key)
+        return entry is not None and entry[1] == EXACT
+
+    def _slots(self, key_hash: int) -> range:
+        """
+        Return the slots a state whose key has key_hash may be kept in.
+        """
+        if self.policy == 'two-tier':
+            first = key_hash % (self.capacity // 2) * 2
+            return range(first, first + 2)
+        first = key_hash % self.capacity
+        return range(first, first + 1)
+
+    def _find(self, key: Hashable) -> Union[Tuple[int, int, int], None]:
+        """
+        Return the score, bound and depth stored for key, or None.
+        """
+        key_hash = hash(key)
+        for slot in self._slots(key_hash):
+            data = self._data[slot]
+            if data != 0 and self._hashes[slot] == key_hash:
+                return (data & 3) - 1, data >> 2 & 3, data >> 4
+        return None
+
+    def probe(self, key: Hashable) -> Union[Tuple[int, int, int], None]:
+        """
+        Return the score, bound (EXACT, LOWER or UPPER) and depth stored for
+        key, or None if key is not stored.
+
+        >>> table = BoundedTranspositionTable(1)
+        >>> table.store((True, 'AB'), -1, UPPER, 3)
+        >>> table.probe((True, 'AB')) == (-1, UPPER, 3)
+        True
+        >>> table.probe((False, 'AB'))
+        >>> table.hits, table.misses
+        (1, 1)
+        """
+        entry = self._find(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def store(self, key: Hashable, score: int, bound: int,
+              depth: int) -> None:
+        """
+        Store score, a bound of kind bound on the score of key, found by a
+        search depth moves deep, unless the replacement policy keeps the
+        state already in its slot.
+        Precondition: score is -1, 0 or 1, and depth >= 0
+
+        >>> table = BoundedTranspositionTable(12 / (1 << 20), 'depth')
+        >>> table.capacity
+        2
+        >>> table.store(0, 1, EXACT, 5)
+        >>> table.store(2, 1, EXACT, 4)
+        >>> table.probe(2), table.probe(0)
+        (None, (1, 1, 5))
+        >>> table.store(2, 0, EXACT, 5)
+        >>> table.probe(0), table.probe(2)
+        (None, (0, 1, 5))
+        >>> table.collisions, table.evictions
+        (2, 1)
+        """
+        key_hash = hash(key)
+        data = depth << 4 | bound << 2 | (score + 1)
+        self.stores += 1
+        hashes, entries = self._hashes, self._data
+        slots = self._slots(key_hash)
+        for slot in slots:
+            if entries[slot] == 0 or hashes[slot] == key_hash:
+                if entries[slot] == 0:
+                    self.size += 1
+                hashes[slot] = key_hash
+                entries[slot] = data
+                return
+        self.collisions += 1
+        slot = slots[0]
+        if self.policy != 'always' and entries[slot] >> 4 > depth:
+            if self.policy == 'depth':
+                return
+            slot = slots[1]
+        elif self.policy == 'two-tier':
+            # the deeper entry it replaces moves down to the second tier
+            hashes[slots[1]] = hashes[slot]
+            entries[slots[1]] = entries[slot]
+        self.evictions += 1
+        hashes[slot] = key_hash
+        entries[slot] = data
+
+    def get(self, key: Hashable) -> Union[int, None]:
+        """
+        Return the exact score stored for key, or None if there is none.
+
+        >>> table = BoundedTranspositionTable(1)
+        >>> table.get((True, 'AB'))
+        >>> table.put((True, 'AB'), 1)
+        >>> table.get((True, 'AB'))
+        1
+        """
+        entry = self.probe(key)
+        if entry is None or entry[1] != EXACT:
+            return None
+        return entry[0]
+
+    def put(self, key: Hashable, score: int, depth: int = 0) -> None:
+        """
+        Store the exact score of key, found by a search depth moves deep.
+        """
+        self.store(key, score, EXACT, depth)
+
+    def clear(self) -> None:
+        """
+        Remove all stored entries and reset the counters.
+
+        >>> table = BoundedTranspositionTable(1)
+        >>> table.put((True, 'AB'), 1)
+        >>> table.clear()
+        >>> len(table), table.get((True, 'AB'))
+        (0, None)
+        """
+        self._hashes = array('q', [0]) * self.capacity
+        self._data = array('i', [0]) * self.capacity
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.collisions = 0
+        self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the counters of this table, with its fill rate, the rate of
+        stores which collided, and the bytes it takes.
+
+        >>> stats = BoundedTranspositionTable(1).stats()
+        >>> stats['fill'], stats['collision_rate'], stats['bytes']
+        (0.0, 0.0, 1048560)
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': self.size,
+                'capacity': self.capacity,
+                'fill': self.size / self.capacity, 'stores': self.stores,
+                'collisions': self.collisions,
+                'collision_rate': (self.collisions / self.stores
+                                   if self.stores > 0 else 0.0),
+                'evictions': self.evictions,
+                'bytes': ENTRY_BYTES * self.capacity}
+
+
+if __name__ == "__main__":
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")